@@ -2,15 +2,13 @@
 import click
 import collections
 import re
-import yaml
 
-from utilities import read_csv, read_lookup_dict, remove_enclosing, write_csv
+from utilities import iter_csv, load_aux_data, remove_departments, remove_enclosing, write_csv, LazyAuxData
 
 SCORE_PATTERN = re.compile(r'([^,]+), ([^,]+), (head of department|musical director) \(([^)]+)\)')
 PARENTHETICAL_PATTERN = re.compile(r'(.*) \((.*)\)')
-DEPARTMENTS = yaml.safe_load(open('aux_data/departments.yaml'))
-HARCODED_SPLITS = yaml.safe_load(open('aux_data/hardcode_splits.yaml'))
-COUNTRIES = yaml.safe_load(open('aux_data/countries.yaml'))
+HARCODED_SPLITS = LazyAuxData('hardcode_splits')
+COUNTRIES = LazyAuxData('countries')
 
 ROLES_TO_IGNORE = {
     'producer',
@@ -104,11 +102,10 @@ def split_nominees(s, nom):
         # Remove Enclosing Brackets
         piece = remove_enclosing(piece, chars=['()'])
 
-        for suffix in DEPARTMENTS:
-            if suffix in piece:
-                piece = piece.replace(suffix, '').strip()
-                if piece == 'Walt Disney':
-                    piece = 'Walt Disney Studios'
+        name = remove_departments(piece)
+        if name != piece and name == 'Walt Disney':
+            name = 'Walt Disney Studios'
+        piece = name
 
         if piece in HARCODED_SPLITS:
             new_pieces += HARCODED_SPLITS[piece]
@@ -117,26 +114,21 @@ def split_nominees(s, nom):
     return new_pieces
 
 
-if __name__ == '__main__':
-    canonical_award_names = read_lookup_dict('aux_data/canonical.yaml', lower_lookup=True)
-    class_lookup = read_lookup_dict('aux_data/classes.yaml')
+def add_fields(noms, canonical_award_names, class_lookup):
     missing_canonical = set()
 
-    o_noms = []
-    # Hack to remove one nomination
-    for nom in read_csv():
+    # To ensure that the canonical categories are correct, for each ceremony we check that the
+    # the CanonicalCategory is only used for one category
+    canon_check = collections.defaultdict(dict)
+
+    for nom in noms:
+        # Hack to remove one nomination
         if nom['Ceremony'] == '1' and nom['Category'] == 'CINEMATOGRAPHY' and nom['Film'] == 'Sunrise':
             # It is considered a single nomination for the film.
             if nom['Name'] == 'Karl Struss':
                 continue
             nom['Name'] = 'Charles Rosher, Karl Struss'
-        o_noms.append(nom)
 
-    # To ensure that the canonical categories are correct, for each ceremony we check that the
-    # the CanonicalCategory is only used for one category
-    canon_check = collections.defaultdict(dict)
-
-    for nom in o_noms:
         # Add Canonical Category
         ceremony = int(nom['Ceremony'])
         category = nom['Category']
@@ -157,6 +149,7 @@ if __name__ == '__main__':
                 if category not in missing_canonical:
                     click.secho(f'Unknown cat: {category}', fg='yellow')
                     missing_canonical.add(category)
+                yield nom
                 continue
             # canon = canonical_award_names.get(category, category)
         nom['CanonicalCategory'] = canon
@@ -179,4 +172,11 @@ if __name__ == '__main__':
         if name:
             nom['Nominees'] = split_nominees(name, nom)
 
-    write_csv(o_noms)
+        yield nom
+
+
+if __name__ == '__main__':
+    canonical_award_names = load_aux_data('canonical', lookup=True, lower_lookup=True)
+    class_lookup = load_aux_data('classes', lookup=True)
+
+    write_csv(add_fields(iter_csv(), canonical_award_names, class_lookup))
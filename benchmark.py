@@ -0,0 +1,273 @@
+#!/usr/bin/python3
+import argparse
+import click
+import collections
+import contextlib
+import copy
+import io
+import pathlib
+import re
+import subprocess
+import sys
+import time
+
+ENTRY_POINTS = ['merge', 'parse_citations', 'add_fields_to_csv', 'parse_oscars_html', 'scrape_imdb_html']
+HEAVY_MODULES = ['bs4', 'lxml', 'requests', 'tqdm', 'unidecode', 'yaml']
+IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+
+
+def measure_imports(module):
+    """Return the import time (in microseconds) and the top level packages imported by the module."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          capture_output=True, text=True, check=True, cwd=pathlib.Path(__file__).parent)
+    total = None
+    packages = set()
+    for line in proc.stderr.splitlines():
+        m = IMPORTTIME_PATTERN.match(line)
+        if not m:
+            continue
+        name = m.group(4)
+        packages.add(name.partition('.')[0])
+        if name == module and not m.group(3):
+            total = int(m.group(2))
+    return total, packages
+
+
+def benchmark_startup(repeats):
+    results = {}
+    for module in ENTRY_POINTS:
+        times = []
+        for _ in range(repeats):
+            total, packages = measure_imports(module)
+            times.append(total)
+        results[module] = min(times), sorted(packages.intersection(HEAVY_MODULES))
+
+    lines = []
+    for module, (total, heavy) in results.items():
+        lines.append(f'{module:24s}| {total / 1000:7.1f} ms | {" ".join(heavy)}'.rstrip())
+    return lines
+
+
+def legacy_extract(element, fields, prefix, clean):
+    """The loop over every div that ExtractionSchema replaced, kept as the baseline."""
+    from parse_oscars_html import add_value
+
+    row = {}
+    for div in element.find_all('div'):
+        text = clean(div.text)
+        if not text:
+            continue
+        for cls in div.get('class', []):
+            cls = cls.replace(prefix, '')
+            if cls in fields:
+                add_value(row, fields[cls], text)
+    return row
+
+
+def benchmark_extraction(filepath, repeats):
+    """Time extracting the fields of every award in the search results, with the old loop and the schema."""
+    from parse_oscars_html import AWARD_SCHEMA, NOTABLE_FIELDS, clean_award_text, iter_year_blocks
+    from utilities import BeautifulParser, find_all_by_class
+
+    awards = []
+    for block_html in iter_year_blocks(filepath):
+        awards += find_all_by_class(BeautifulParser(block_html), 'div', 'result-details')
+
+    results = {}
+    extractors = {
+        'loop': lambda award_html: legacy_extract(award_html, NOTABLE_FIELDS, 'awards-result-', clean_award_text),
+        'schema': lambda award_html: AWARD_SCHEMA.extract(award_html, {}),
+    }
+    for name, extract in extractors.items():
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            rows = [extract(award_html) for award_html in awards]
+            times.append(time.perf_counter() - start)
+        results[name] = min(times), rows
+
+    if results['loop'][1] != results['schema'][1]:
+        raise click.ClickException('The schema and the loop extracted different fields')
+
+    lines = [f'{len(awards)} awards']
+    for name, (seconds, rows) in results.items():
+        lines.append(f'{name:24s}| {seconds * 1000:7.1f} ms')
+    return lines
+
+
+def legacy_nabble(s):
+    import unidecode
+
+    if s is None:
+        return None
+    new_name = ''
+    for c in unidecode.unidecode(s).lower():
+        if c.isalpha() or c.isdigit():
+            new_name += c
+    return new_name
+
+
+def legacy_clean_string(text):
+    text = text.replace('\n', ' ')
+    while '  ' in text:
+        text = text.replace('  ', ' ')
+    return text
+
+
+def legacy_remove_departments(name):
+    from utilities import load_aux_data
+
+    for suffix in load_aux_data('departments'):
+        if suffix in name:
+            name = name.replace(suffix, '').strip()
+    return name
+
+
+def benchmark_normalization(repeats):
+    """Time the old and the memoized normalization of every name, title and citation in the csv."""
+    from utilities import clean_string, get_nabble, load_aux_data, read_csv, remove_departments
+
+    texts = []
+    for row in read_csv():
+        for field in ['Film', 'Name', 'Nominees', 'Detail', 'Citation']:
+            value = row[field]
+            texts += value if isinstance(value, list) else value.split('|') if value else []
+    suffixes = list(load_aux_data('departments'))
+    names = texts + [f'{text} {suffixes[i % len(suffixes)]} ' for i, text in enumerate(texts[::10])]
+
+    # As in the text of the divs of the html pages
+    divs = [f'\n            {text}\n          ' for text in texts] + texts
+
+    functions = {
+        'nabble': (texts, legacy_nabble, get_nabble),
+        'clean_string': (divs, legacy_clean_string, clean_string),
+        'remove_departments': (names, legacy_remove_departments, remove_departments),
+    }
+    lines = [f'{len(texts)} strings, {len(set(texts))} distinct']
+    for name, (values, legacy, current) in functions.items():
+        if [legacy(value) for value in values] != [current(value) for value in values]:
+            raise click.ClickException(f'The old and new {name} differ')
+        for label, function in [('old', legacy), ('new', current)]:
+            times = []
+            for _ in range(repeats):
+                if hasattr(function, 'cache_clear'):
+                    function.cache_clear()
+                start = time.perf_counter()
+                for _ in range(2):
+                    for value in values:
+                        function(value)
+                times.append(time.perf_counter() - start)
+            lines.append(f'{f"{name} ({label})":24s}| {min(times) * 1000:7.1f} ms')
+    return lines
+
+
+def legacy_first_names_match(a, b, length=3):
+    """first_names_match with the linear scan of FIRST_NAMES that the first name classes replaced."""
+    from merge import FIRST_NAMES
+
+    if a == b:
+        return True
+    if a[:length] == b[:length]:
+        return True
+
+    if (len(a) > 1 and a[1] == '.') or (len(b) > 1 and b[1] == '.'):
+        if a[0] == b[0]:
+            return True
+
+    for row in FIRST_NAMES:
+        if a in row and b in row:
+            return True
+
+
+def legacy_get_blocks(name, query=False):
+    """NameIndex.get_blocks with the equivalent first names found by a linear scan of FIRST_NAMES."""
+    from merge import FIRST_NAMES, get_nabble, name_split
+
+    parts = name_split(name)
+    blocks = [('nabble', get_nabble(name))]
+    if parts:
+        blocks.append(('surname', parts[-1], parts[0][0]))
+        for row_number, row in enumerate(FIRST_NAMES):
+            if parts[0] in row:
+                blocks.append(('surname', parts[-1], row_number))
+    if len(parts) == 2:
+        blocks.append(('parts', parts[::-1] if query else parts))
+        if '-' in parts[0]:
+            blocks.append(('hyphenated', parts))
+    elif len(parts) == 3:
+        blocks.append(('hyphenated', ('-'.join(parts[1:]), parts[0])))
+    return blocks
+
+
+def benchmark_leftovers(year, repeats):
+    """Time the leftovers pass of merge over a year, with and without the first name classes."""
+    import merge
+    from utilities import load_imdb_data, read_csv
+
+    merge.args = argparse.Namespace(mode='benchmark', category_matching=False, scitech=False, core=False,
+                                    matcher='greedy')
+    rows = read_csv()
+    oscars = collections.defaultdict(list)
+    for year_number, nom in zip(rows.year_numbers, rows):
+        oscars[year_number].append(nom)
+    imdb_data = load_imdb_data(sorted(oscars))
+    if year is None:
+        year = max(imdb_data, key=lambda year_number: len(oscars[year_number]))
+    i_noms = [i_nom for i_cat in imdb_data[year]['awards'].values() for i_nom in i_cat]
+
+    results = {}
+    first_names_match, get_blocks = merge.first_names_match, merge.NameIndex.get_blocks
+    for name, function, blocks_function in [('scan', legacy_first_names_match, legacy_get_blocks),
+                                            ('classes', first_names_match, get_blocks)]:
+        merge.first_names_match = function
+        merge.NameIndex.get_blocks = staticmethod(blocks_function)
+        times = []
+        for _ in range(repeats):
+            o_noms = copy.deepcopy(oscars[year])
+            i_noms_copy = copy.deepcopy(i_noms)
+            with contextlib.redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                new_o, new_i = merge.match_category(o_noms, i_noms_copy, 'nominee')
+                merge.match_category(new_o, new_i, 'film')
+                times.append(time.perf_counter() - start)
+        results[name] = min(times), o_noms
+    merge.first_names_match, merge.NameIndex.get_blocks = first_names_match, staticmethod(get_blocks)
+
+    if results['scan'][1] != results['classes'][1]:
+        raise click.ClickException('The first name classes matched differently')
+
+    lines = [f'{year}: {len(oscars[year])} Oscars and {len(i_noms)} IMDb nominations']
+    for name, (seconds, o_noms) in results.items():
+        lines.append(f'{name:24s}| {seconds * 1000:7.1f} ms')
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('suite', choices=['startup', 'extraction', 'normalization', 'leftovers'])
+    parser.add_argument('-r', '--repeats', type=int, default=5)
+    parser.add_argument('-w', '--write', action='store_true')
+    parser.add_argument('--html', default='oscars_html/search_results.html')
+    parser.add_argument('--year', type=int, help='Year for the leftovers (the one with the most by default)')
+    args = parser.parse_args()
+
+    if args.suite == 'startup':
+        click.secho(f'Import time per entry point (best of {args.repeats})', bold=True)
+        lines = benchmark_startup(args.repeats)
+        for line in lines:
+            click.secho(line)
+        if args.write:
+            with open('startup.txt', 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+    elif args.suite == 'extraction':
+        click.secho(f'Field extraction from {args.html} (best of {args.repeats})', bold=True)
+        for line in benchmark_extraction(args.html, args.repeats):
+            click.secho(line)
+    elif args.suite == 'normalization':
+        click.secho(f'Text normalization (best of {args.repeats})', bold=True)
+        for line in benchmark_normalization(args.repeats):
+            click.secho(line)
+    elif args.suite == 'leftovers':
+        click.secho(f'Leftovers pass of merge (best of {args.repeats})', bold=True)
+        for line in benchmark_leftovers(args.year, args.repeats):
+            click.secho(line)
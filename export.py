@@ -0,0 +1,199 @@
+#!/usr/bin/python3
+import argparse
+import click
+import contextlib
+import sqlite3
+
+from utilities import FIELDNAMES, atomic_path, read_csv, parse_year, split_ids
+
+# Pairs of multi-valued fields that line up by position, exported as child tables
+CHILD_TABLES = {
+    'Films': ('Film', 'FilmId'),
+    'Nominees': ('Nominees', 'NomineeIds'),
+}
+LIST_FIELDS = ['Film', 'FilmId', 'Nominees', 'NomineeIds', 'Detail', 'Note']
+CATEGORICAL_FIELDS = ['Year', 'Class', 'CanonicalCategory', 'Category']
+
+SCHEMA = '''
+CREATE TABLE Nominations (
+    NominationId INTEGER PRIMARY KEY,
+    Ceremony INTEGER NOT NULL,
+    Year TEXT NOT NULL,
+    StartYear INTEGER NOT NULL,
+    Class TEXT,
+    CanonicalCategory TEXT,
+    Category TEXT,
+    Film TEXT,
+    FilmId TEXT,
+    Name TEXT,
+    Nominees TEXT,
+    NomineeIds TEXT,
+    Winner INTEGER NOT NULL,
+    Detail TEXT,
+    Note TEXT,
+    Citation TEXT
+);
+CREATE TABLE Films (
+    NominationId INTEGER NOT NULL REFERENCES Nominations,
+    Position INTEGER NOT NULL,
+    Film TEXT,
+    FilmId TEXT
+);
+CREATE TABLE Nominees (
+    NominationId INTEGER NOT NULL REFERENCES Nominations,
+    Position INTEGER NOT NULL,
+    Nominee TEXT,
+    NomineeId TEXT
+);
+'''
+
+INDEXES = '''
+CREATE INDEX NominationsStartYear ON Nominations (StartYear);
+CREATE INDEX NominationsCanonicalCategory ON Nominations (CanonicalCategory);
+CREATE INDEX FilmsFilmId ON Films (FilmId);
+CREATE INDEX FilmsNominationId ON Films (NominationId);
+CREATE INDEX NomineesNomineeId ON Nominees (NomineeId);
+CREATE INDEX NomineesNominationId ON Nominees (NominationId);
+'''
+
+
+def split_values(value):
+    if isinstance(value, list):
+        return value
+    return value.split('|') if value else []
+
+
+def get_children(row, name_field, id_field):
+    """Yield (position, name, id) for each entity of a pair of multi-valued fields. Unknown ids (?) become None."""
+    id_groups = split_values(row[id_field])
+    for position, name in enumerate(split_values(row[name_field])):
+        # A name credited to several people (like Roderick Jaynes) holds all of their ids, joined with commas
+        group = id_groups[position] if position < len(id_groups) else ''
+        for entity_id in split_ids(group) or ['']:
+            yield position, name, None if entity_id in ('?', '') else entity_id
+
+
+def get_unnamed_ids(row, name_field, id_field):
+    return split_values(row[id_field])[len(split_values(row[name_field])):]
+
+
+class SQLiteExporter:
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+        self.nominations = []
+        self.children = {name: [] for name in CHILD_TABLES}
+
+    def add(self, nomination_id, row):
+        values = [nomination_id, int(row['Ceremony']), row['Year'], parse_year(str(row['Year']))]
+        for field in FIELDNAMES[2:]:
+            value = row[field]
+            if field == 'Winner':
+                values.append(int(bool(value)))
+                continue
+            if isinstance(value, list):
+                value = '|'.join(value)
+            values.append(value or None)
+        self.nominations.append(values)
+
+        for table, fields in CHILD_TABLES.items():
+            for position, name, entity_id in get_children(row, *fields):
+                self.children[table].append((nomination_id, position, name, entity_id))
+
+    def close(self):
+        with self.connection:
+            placeholders = ', '.join(['?'] * (len(FIELDNAMES) + 2))
+            self.connection.executemany(f'INSERT INTO Nominations VALUES ({placeholders})', self.nominations)
+            for table, rows in self.children.items():
+                self.connection.executemany(f'INSERT INTO {table} VALUES (?, ?, ?, ?)', rows)
+            # Building the indexes after the inserts is much faster than maintaining them during
+            self.connection.executescript(INDEXES)
+        self.connection.execute('VACUUM')
+        self.connection.close()
+
+
+class ParquetExporter:
+    def __init__(self, path):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise click.ClickException('Exporting to parquet requires pyarrow (pip install pyarrow)')
+        self.path = path
+        self.columns = {field: [] for field in ['NominationId', 'StartYear'] + FIELDNAMES}
+
+    def add(self, nomination_id, row):
+        self.columns['NominationId'].append(nomination_id)
+        self.columns['StartYear'].append(parse_year(str(row['Year'])))
+        # The lists of names and ids line up, like the rows of the child tables
+        children = {}
+        for name_field, id_field in CHILD_TABLES.values():
+            entities = list(get_children(row, name_field, id_field))
+            children[name_field] = [name for _, name, _ in entities]
+            children[id_field] = [entity_id for _, _, entity_id in entities]
+        for field in FIELDNAMES:
+            value = row[field]
+            if field == 'Ceremony':
+                value = int(value)
+            elif field == 'Winner':
+                value = bool(value)
+            elif field in children:
+                value = children[field]
+            elif field in LIST_FIELDS:
+                value = split_values(value)
+            self.columns[field].append(value)
+
+    def close(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        arrays = {}
+        for field, values in self.columns.items():
+            if field in ['NominationId', 'StartYear', 'Ceremony']:
+                arrays[field] = pa.array(values, pa.int32())
+            elif field == 'Winner':
+                arrays[field] = pa.array(values, pa.bool_())
+            elif field in LIST_FIELDS:
+                arrays[field] = pa.array(values, pa.list_(pa.string()))
+            elif field in CATEGORICAL_FIELDS:
+                arrays[field] = pa.array(values, pa.string()).dictionary_encode()
+            else:
+                arrays[field] = pa.array(values, pa.string())
+        pq.write_table(pa.table(arrays), self.path, compression='zstd')
+
+
+def export(awards, sqlite_path=None, parquet_path=None):
+    """Export the rows to an indexed SQLite database and/or a parquet file in a single pass."""
+    with contextlib.ExitStack() as stack:
+        exporters = []
+        if sqlite_path:
+            exporters.append(SQLiteExporter(stack.enter_context(atomic_path(sqlite_path))))
+        if parquet_path:
+            exporters.append(ParquetExporter(stack.enter_context(atomic_path(parquet_path))))
+
+        count = 0
+        unnamed = []
+        for nomination_id, row in enumerate(awards, 1):
+            for exporter in exporters:
+                exporter.add(nomination_id, row)
+            if any(get_unnamed_ids(row, *fields) for fields in CHILD_TABLES.values()):
+                unnamed.append(nomination_id)
+            count += 1
+        if unnamed:
+            click.secho(f'Skipped the ids without a name in nominations {', '.join(map(str, unnamed))}', fg='yellow')
+
+        for exporter in exporters:
+            exporter.close()
+    return count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-s', '--sqlite', nargs='?', const='oscars.sqlite')
+    parser.add_argument('-p', '--parquet', nargs='?', const='oscars.parquet')
+    args = parser.parse_args()
+
+    if not args.sqlite and not args.parquet:
+        parser.error('Specify at least one of --sqlite and --parquet')
+
+    count = export(read_csv(), args.sqlite, args.parquet)
+    click.secho(f'Exported {count} nominations.', fg='blue')
@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+import argparse
+import click
+import pathlib
+import shutil
+
+from utilities import HtmlArchive, archive_html, atomic_write, parse_timestamp
+
+FOLDERS = ['imdb_src', 'oscars_html']
+
+
+def add(folder, prune=False):
+    """Archive the html files in the folder. With prune, the files are then removed, leaving only the archive."""
+    paths = sorted(pathlib.Path(folder).glob('*.html'))
+    changed = archive_html(paths)
+    if prune:
+        for path in paths:
+            path.unlink()
+    return changed
+
+
+def restore(folder, as_of=None):
+    """Write the latest version of each archived page (archived before as_of if given) back into the folder."""
+    archive = HtmlArchive(folder)
+    restored = []
+    for name in sorted(archive.history):
+        if not archive.find(name, as_of):
+            continue
+        with archive.open(name, as_of, 'rb') as src, atomic_write(pathlib.Path(folder) / name, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        restored.append(name)
+    return restored
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the compressed archives of the downloaded html pages')
+    parser.add_argument('command', choices=['add', 'log', 'restore'])
+    parser.add_argument('folders', nargs='*', default=FOLDERS)
+    parser.add_argument('-p', '--prune', action='store_true', help='Remove the html files once they are archived')
+    parser.add_argument('--as-of', type=parse_timestamp, help='Restore the pages archived before this date/time')
+    args = parser.parse_args()
+
+    for folder in args.folders:
+        if args.command == 'add':
+            changed = add(folder, args.prune)
+            click.secho(f'{folder}: archived {len(changed)} new versions', fg='blue')
+        elif args.command == 'restore':
+            restored = restore(folder, args.as_of)
+            click.secho(f'{folder}: restored {len(restored)} pages', fg='blue')
+        else:
+            for name, versions in sorted(HtmlArchive(folder).history.items()):
+                click.secho(f'{folder}/{name}', bold=True)
+                for version in versions:
+                    click.secho(f'\t{version["archived"]}  {version["hash"]}  {version["size"]:>10,d} bytes')
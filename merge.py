@@ -1,20 +1,24 @@
 #!/usr/bin/python3
 import argparse
 import collections
+import concurrent.futures
+import contextlib
+import functools
+import heapq
+import io
+import os
 import click
-import pathlib
-import unidecode
 import re
-import yaml
 
-from utilities import read_csv, write_csv, read_lookup_dict, parse_years, parse_year
+from utilities import read_csv, write_csv, parse_years, load_imdb_data, load_aux_data, LazyAuxData
+from utilities import get_nabble
 
 PAREN_PATTERN = re.compile(r'^(.*) \((.*)\)$')
 COLON_PATTERN = re.compile(r'^(.*): (.*)$')
 
-FIRST_NAMES = yaml.safe_load(open('aux_data/first_names.yaml'))
-SUFFIXES = yaml.safe_load(open('aux_data/suffixes.yaml'))
-COMPANY_LOOKUP = read_lookup_dict('aux_data/companies.yaml')
+FIRST_NAMES = LazyAuxData('first_names')
+SUFFIXES = LazyAuxData('suffixes')
+COMPANY_LOOKUP = LazyAuxData('companies', lookup=True)
 COMPANY_CATEGORIES = {
     'BEST PICTURE', 'UNIQUE AND ARTISTIC PICTURE', 'SPECIAL AWARD', 'OUTSTANDING PRODUCTION',
     'SHORT SUBJECT (Comedy)', 'SHORT SUBJECT (Novelty)', 'SHORT SUBJECT (Color)', 'SHORT SUBJECT (One-reel)',
@@ -24,11 +28,11 @@ COMPANY_CATEGORIES = {
     'DOCUMENTARY (Feature)', 'MUSIC (Original Song Score or Adaptation Score)', 'SOUND MIXING',
     'VISUAL EFFECTS', 'SHORT FILM (Live Action)',
 }
-NAME_ALIASES = read_lookup_dict('aux_data/name_aliases.yaml')
-FILM_ALIASES = yaml.safe_load(open('aux_data/film_aliases.yaml'))
-SONG_ALIASES = yaml.safe_load(open('aux_data/song_aliases.yaml'))
-IMDB_CAT = yaml.safe_load(open('aux_data/imdb_cat_to_canon.yaml'))
-MATCH_MODES = yaml.safe_load(open('aux_data/match_modes.yaml'))
+NAME_ALIASES = LazyAuxData('name_aliases', lookup=True)
+FILM_ALIASES = LazyAuxData('film_aliases')
+SONG_ALIASES = LazyAuxData('song_aliases')
+IMDB_CAT = LazyAuxData('imdb_cat_to_canon')
+MATCH_MODES = LazyAuxData('match_modes')
 
 CATEGORY_STATS = collections.Counter()
 NOM_STATS = collections.Counter()
@@ -36,16 +40,7 @@ FILM_STATS = collections.Counter()
 NOMINEE_STATS = collections.Counter()
 SONG_STATS = collections.Counter()
 NAME_MISSES = collections.Counter()
-
-
-def get_nabble(s):
-    if s is None:
-        return None
-    new_name = ''
-    for c in unidecode.unidecode(s).lower():
-        if c.isalpha() or c.isdigit():
-            new_name += c
-    return new_name
+STATS = [CATEGORY_STATS, NOM_STATS, FILM_STATS, NOMINEE_STATS, SONG_STATS, NAME_MISSES]
 
 
 def get_nominees(entry, clean=True):
@@ -98,6 +93,7 @@ def titles_match(a, b):
                     return True
 
 
+@functools.cache
 def name_split(s):
     parts = s.title().split()
     if parts and parts[0] == 'Dr.':
@@ -106,7 +102,26 @@ def name_split(s):
     for suffix in SUFFIXES:
         if parts and parts[-1] == suffix:
             parts = parts[:-1]
-    return parts
+    return tuple(parts)
+
+
+@functools.cache
+def get_first_name_classes():
+    """Map each first name in FIRST_NAMES to the id of its class of equivalent names."""
+    parents = {}
+
+    def find(name):
+        while parents[name] != name:
+            parents[name] = parents[parents[name]]
+            name = parents[name]
+        return name
+
+    for row in FIRST_NAMES:
+        for name in row:
+            parents.setdefault(name, name)
+        for name in row[1:]:
+            parents[find(name)] = find(row[0])
+    return {name: find(name) for name in parents}
 
 
 def first_names_match(a, b, length=3):
@@ -119,9 +134,9 @@ def first_names_match(a, b, length=3):
         if a[0] == b[0]:
             return True
 
-    for row in FIRST_NAMES:
-        if a in row and b in row:
-            return True
+    classes = get_first_name_classes()
+    if a in classes and classes.get(b) == classes[a]:
+        return True
 
 
 def names_match(a, b):
@@ -145,43 +160,168 @@ def names_match(a, b):
         return True
 
 
-def get_matching_key(query, values_d, match_fn, aliases):
-    if query in values_d:
-        return query
+class TitleIndex:
+    """Finds the items added with a title that titles_match a query."""
+
+    def __init__(self):
+        self.nabbles = collections.defaultdict(list)
+        self.the_nabbles = collections.defaultdict(list)  # By the nabble of the rest of titles starting with 'The '
+        self.titles = collections.defaultdict(list)
+        self.parts = collections.defaultdict(list)
+
+    def add(self, title, item):
+        if title is None:
+            return
+        self.nabbles[get_nabble(title)].append(item)
+        if title.startswith('The '):
+            self.the_nabbles[get_nabble(title[4:])].append(item)
+        self.titles[title].append(item)
+        for pattern in [COLON_PATTERN, PAREN_PATTERN]:
+            m = pattern.match(title)
+            if m:
+                for part in set(m.groups()):
+                    self.parts[part].append(item)
+
+    def find(self, query):
+        """Return the items with a title that titles_match the query (possibly repeated)."""
+        nabble = get_nabble(query)
+        items = self.nabbles.get(nabble, []) + self.the_nabbles.get(nabble, []) + self.parts.get(query, [])
+        if query.startswith('The '):
+            items += self.nabbles.get(get_nabble(query[4:]), [])
+        for pattern in [COLON_PATTERN, PAREN_PATTERN]:
+            m = pattern.match(query)
+            if m:
+                for part in m.groups():
+                    items += self.titles.get(part, [])
+        return items
+
+
+class KeyIndex:
+    """Finds the key of values_d that matches a query."""
+
+    def __init__(self, values_d, match_fn, aliases):
+        self.values_d = values_d
+        self.shorts = collections.defaultdict(list)
+        if match_fn is titles_match:
+            self.titles = TitleIndex()
+        elif match_fn is None:
+            self.titles = None
+        else:
+            raise ValueError(f'Cannot index keys for {match_fn.__name__}')
 
-    short = get_nabble(query)
-    for key in values_d:
-        if key in aliases:
-            sk = get_nabble(aliases[key])
-        elif not isinstance(values_d[key], dict) and values_d[key] in aliases:
-            sk = get_nabble(aliases[values_d[key]])
+        for position, key in enumerate(values_d):
+            if key in aliases:
+                sk = get_nabble(aliases[key])
+            elif not isinstance(values_d[key], dict) and values_d[key] in aliases:
+                sk = get_nabble(aliases[values_d[key]])
+            else:
+                sk = get_nabble(key)
+            self.shorts[sk].append((position, key))
+            if self.titles is not None:
+                self.titles.add(key, (position, key))
+
+    def get_matching_key(self, query):
+        if query in self.values_d:
+            return query
+
+        candidates = self.shorts.get(get_nabble(query), [])
+        if self.titles is not None:
+            candidates = candidates + self.titles.find(query)
+        candidates = [candidate for candidate in candidates if candidate[1] in self.values_d]
+        if candidates:
+            return min(candidates)[1]
+
+
+def get_trigrams(s):
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+
+class NameIndex:
+    """Finds the items added with a name that might names_match a query."""
+
+    def __init__(self):
+        self.items = []
+        self.blocks = collections.defaultdict(list)
+        self.prefixes = collections.defaultdict(list)
+        self.trigrams = collections.defaultdict(list)
+        self.short = []  # Names without trigrams, which might be in any query
+
+    @staticmethod
+    def get_blocks(name, query=False):
+        parts = name_split(name)
+        blocks = [('nabble', get_nabble(name))]
+        if parts:
+            blocks.append(('surname', parts[-1], parts[0][0]))
+            first_name_class = get_first_name_classes().get(parts[0])
+            if first_name_class is not None:
+                blocks.append(('surname', parts[-1], first_name_class))
+        if len(parts) == 2:
+            blocks.append(('parts', parts[::-1] if query else parts))
+            if '-' in parts[0]:
+                blocks.append(('hyphenated', parts))
+        elif len(parts) == 3:
+            blocks.append(('hyphenated', ('-'.join(parts[1:]), parts[0])))
+        return blocks
+
+    def add(self, name, item):
+        if name is None:
+            return
+        self.items.append(item)
+        for block in self.get_blocks(name):
+            self.blocks[block].append(item)
+        if len(name) < 3:
+            self.short.append(item)
         else:
-            sk = get_nabble(key)
-        if sk == short:
-            return key
+            self.prefixes[name[:3]].append(item)
+        for trigram in get_trigrams(name):
+            self.trigrams[trigram].append(item)
+
+    def find(self, query):
+        """Return the items with a name that might match the query (possibly repeated)."""
+        if len(query) < 3:
+            return self.items
+
+        items = list(self.short)
+        for block in self.get_blocks(query, query=True):
+            items += self.blocks.get(block, [])
+        trigrams = get_trigrams(query)
+        for trigram in trigrams:
+            items += self.prefixes.get(trigram, [])
+        items += min((self.trigrams.get(trigram, []) for trigram in trigrams), key=len)
+        return items
+
+
+def get_candidate_keys(nom_vals, i_noms_d, aliases, index=None):
+    """Return the keys of i_noms_d that might match any of nom_vals."""
+    if index is None or any(nom_name in aliases for nom_name in nom_vals):
+        return set(i_noms_d)
+    return {nom_key for nom_name in nom_vals for nom_key in index.find(nom_name) if nom_key in i_noms_d}
+
+
+def count_matches(nom_vals, nom_key, i_nom, match_fn, aliases):
+    """Return how many of nom_vals match a value of nom_key (or are aliases of an id in i_nom)."""
+    match_count = 0
+    for nom_name in nom_vals:
+        if nom_name in aliases and aliases[nom_name] in i_nom:
+            match_count += 1
+            continue
 
-        if match_fn and match_fn(query, key):
-            return key
+        for nom_key_val in nom_key:
+            if match_fn(nom_key_val, nom_name):
+                match_count += 1
+                break
+    return match_count
 
 
-def get_best_matching_key(nom_vals, i_noms_d, match_fn, aliases):
+def get_best_matching_key(nom_vals, i_noms_d, match_fn, aliases, index=None):
     if nom_vals in i_noms_d:
         return nom_vals
 
     best_key = None
     best_count = 0
 
-    for nom_key, i_nom in sorted(i_noms_d.items()):
-        match_count = 0
-        for nom_name in nom_vals:
-            if nom_name in aliases and aliases[nom_name] in i_nom:
-                match_count += 1
-                continue
-
-            for nom_key_val in nom_key:
-                if match_fn(nom_key_val, nom_name):
-                    match_count += 1
-                    break
+    for nom_key in sorted(get_candidate_keys(nom_vals, i_noms_d, aliases, index)):
+        match_count = count_matches(nom_vals, nom_key, i_noms_d[nom_key], match_fn, aliases)
         if match_count == 0:
             continue
         if best_key is None or best_count < match_count:
@@ -191,6 +331,95 @@ def get_best_matching_key(nom_vals, i_noms_d, match_fn, aliases):
     return best_key
 
 
+def solve_assignment(weights):
+    """Return the (row, column) pairs of an assignment with the maximum total weight."""
+    import numpy
+
+    if weights.shape[0] > weights.shape[1]:
+        return sorted((row, column) for column, row in solve_assignment(weights.T))
+
+    n, m = weights.shape
+    costs = weights.max(initial=0) - weights
+    row_potentials = numpy.zeros(n + 1)
+    column_potentials = numpy.zeros(m + 1)
+    rows = numpy.zeros(m + 1, dtype=int)  # The (1-based) row assigned to each column, 0 for none
+    previous = numpy.zeros(m + 1, dtype=int)  # The previous column on the shortest path to each column
+
+    for row in range(1, n + 1):
+        rows[0] = row
+        column = 0
+        min_costs = numpy.full(m + 1, numpy.inf)
+        used = numpy.zeros(m + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current_row = rows[column]
+            reduced = numpy.full(m + 1, numpy.inf)
+            reduced[1:] = costs[current_row - 1] - row_potentials[current_row] - column_potentials[1:]
+            improved = ~used & (reduced < min_costs)
+            min_costs[improved] = reduced[improved]
+            previous[improved] = column
+            free_costs = numpy.where(used, numpy.inf, min_costs)
+            next_column = int(free_costs.argmin())
+            delta = free_costs[next_column]
+            row_potentials[rows[used]] += delta
+            column_potentials[used] -= delta
+            min_costs[~used] -= delta
+            column = next_column
+            if rows[column] == 0:
+                break
+
+        while column:
+            rows[column] = rows[previous[column]]
+            column = previous[column]
+
+    return sorted((rows[column] - 1, column - 1) for column in range(1, m + 1) if rows[column])
+
+
+def assign_keys(o_vals, i_noms_d, match_fn, aliases, index=None, matcher='optimal'):
+    """Return the key of i_noms_d assigned to each of o_vals (or None), and the greedy picks."""
+    import numpy
+
+    keys = sorted(i_noms_d)
+    columns = {nom_key: column for column, nom_key in enumerate(keys)}
+    counts = numpy.zeros((len(o_vals), len(keys)), dtype=int)
+    for row, nom_vals in enumerate(o_vals):
+        for nom_key in get_candidate_keys(nom_vals, i_noms_d, aliases, index):
+            counts[row, columns[nom_key]] = count_matches(nom_vals, nom_key, i_noms_d[nom_key], match_fn, aliases)
+
+    greedy = [None] * len(o_vals)
+    available = numpy.ones(len(keys), dtype=bool)
+    for row, nom_vals in enumerate(o_vals):
+        if nom_vals in columns and available[columns[nom_vals]]:
+            column = columns[nom_vals]
+        elif keys:
+            row_counts = numpy.where(available, counts[row], 0)
+            column = int(row_counts.argmax())
+            if row_counts[column] == 0:
+                continue
+        else:
+            continue
+        greedy[row] = column
+        available[column] = False
+
+    greedy_total = sum(counts[row, column] for row, column in enumerate(greedy) if column is not None)
+    if matcher == 'greedy' or greedy_total == counts.max(axis=1, initial=0).sum():
+        # Every nomination got a key with its most matches, which no assignment can beat
+        assignment = greedy
+    else:
+        weights = counts * (len(o_vals) + 1)
+        for row, column in enumerate(greedy):
+            if column is not None:
+                weights[row, column] += 1
+        assignment = [None] * len(o_vals)
+        for row, column in solve_assignment(weights):
+            if counts[row, column]:
+                assignment[row] = column
+
+    def get_keys(assigned):
+        return [None if column is None else keys[column] for column in assigned]
+    return get_keys(assignment), get_keys(greedy)
+
+
 def get_name_match(nom_name, people):
     if nom_name in people:
         return nom_name
@@ -228,13 +457,14 @@ def match_nomination(o_nom, i_nom, match_mode, speculative=False):
         elif not speculative:
             changed = True
             film_ids = ['?'] * len(o_titles)
+            title_index = KeyIndex(i_titles, titles_match, FILM_ALIASES)
             while changed:
                 changed = False
                 for oi, o_title in enumerate(o_titles):
                     if film_ids[oi] != '?':
                         continue
 
-                    matching_key = get_matching_key(o_title, i_titles, titles_match, FILM_ALIASES)
+                    matching_key = title_index.get_matching_key(o_title)
 
                     if matching_key:
                         film_ids[oi] = i_titles[matching_key]
@@ -386,7 +616,17 @@ def match_nomination(o_nom, i_nom, match_mode, speculative=False):
     return valid
 
 
-def match_category(o_noms, i_noms, match_mode, speculative=False):
+def get_nomination_values(o_nom, match_mode):
+    """Return what match_category matches the keys with for the Oscar nomination."""
+    if match_mode == 'film':
+        return tuple(o_nom['Film'].split('|'))
+    elif match_mode == 'song':
+        return o_nom['Detail']
+    return tuple(get_nominees(o_nom, clean=False))
+
+
+def prepare_nominations(i_noms, match_mode):
+    """Key the IMDb nominations of a category for match_category."""
     i_noms_d = {}
     i_noms_c = collections.Counter()  # For handling multiple noms per key
     # Mostly just applies to IVAN KRUGLAK
@@ -413,18 +653,71 @@ def match_category(o_noms, i_noms, match_mode, speculative=False):
             i_noms_d[nom_key] = nom
         i_noms_c[nom_key] += 1
 
+    index = None
+    if match_mode == 'film':
+        index = TitleIndex()
+    elif match_mode != 'song':
+        index = NameIndex()
+    if index is not None:
+        for nom_key in i_noms_d:
+            for value in nom_key:
+                index.add(value, nom_key)
+    return i_noms_d, i_noms_c, i_unmatched, index
+
+
+def get_score_bound(o_noms, i_noms, match_mode, prepared):
+    """Return an upper bound of the speculative score of match_category."""
+    i_noms_d, i_noms_c, i_unmatched, index = prepared
+    if match_mode == 'song':
+        song_index = KeyIndex(i_noms_d, None, SONG_ALIASES)
+        possible = sum(1 for o_nom in o_noms if song_index.get_matching_key(o_nom['Detail']))
+    else:
+        aliases = FILM_ALIASES if match_mode == 'film' else NAME_ALIASES
+        possible = sum(1 for o_nom in o_noms
+                       if get_candidate_keys(get_nomination_values(o_nom, match_mode), i_noms_d, aliases, index))
+    i_matched_count = len(i_noms) - len(i_noms_d) + min(possible, len(i_noms_d))
+    return (possible + i_matched_count) / (len(o_noms) + len(i_noms))
+
+
+def match_category(o_noms, i_noms, match_mode, speculative=False, prepared=None, memo=None):
+    if prepared is None:
+        prepared = prepare_nominations(i_noms, match_mode)
+    i_noms_d, i_noms_c, i_unmatched, index = prepared
+    i_noms_d = dict(i_noms_d)
+    i_noms_c = collections.Counter(i_noms_c)
+    i_unmatched = list(i_unmatched)
+    if match_mode == 'song':
+        song_index = KeyIndex(i_noms_d, None, SONG_ALIASES)
+
     o_unmatched = []
 
-    for o_nom in o_noms:
-        if match_mode in ['nominee', 'multi', 'nominee+']:
-            nom_vals = tuple(get_nominees(o_nom, clean=False))
-            matching_key = get_best_matching_key(nom_vals, i_noms_d, names_match, NAME_ALIASES)
-        elif match_mode == 'film':
-            nom_vals = tuple(o_nom['Film'].split('|'))
-            matching_key = get_best_matching_key(nom_vals, i_noms_d, titles_match, FILM_ALIASES)
+    # Where each key matches at most one nomination, the keys are assigned over the whole category at once
+    assigned_keys = None
+    if match_mode in ['nominee', 'film']:
+        if memo is not None and 'assigned_keys' in memo:
+            assigned_keys, greedy_keys = memo['assigned_keys']
+        else:
+            o_vals = [get_nomination_values(o_nom, match_mode) for o_nom in o_noms]
+            match_fn, aliases = (names_match, NAME_ALIASES) if match_mode == 'nominee' else (titles_match, FILM_ALIASES)
+            assigned_keys, greedy_keys = assign_keys(o_vals, i_noms_d, match_fn, aliases, index, matcher=args.matcher)
+            if memo is not None:
+                memo['assigned_keys'] = assigned_keys, greedy_keys
+        if not speculative and (args.mode is None or args.mode == 'assignment'):
+            for o_nom, assigned_key, greedy_key in zip(o_noms, assigned_keys, greedy_keys):
+                if assigned_key != greedy_key:
+                    nom_vals = get_nomination_values(o_nom, match_mode)
+                    click.secho(f'Assignment differs for {nom_vals}: {assigned_key} (greedy: {greedy_key})',
+                                fg='magenta')
+
+    for oi, o_nom in enumerate(o_noms):
+        if assigned_keys is not None:
+            matching_key = assigned_keys[oi]
+        elif match_mode in ['multi', 'nominee+']:
+            nom_vals = get_nomination_values(o_nom, match_mode)
+            matching_key = get_best_matching_key(nom_vals, i_noms_d, names_match, NAME_ALIASES, index)
         elif match_mode == 'song':
             nom_val = o_nom['Detail']
-            matching_key = get_matching_key(nom_val, i_noms_d, None, SONG_ALIASES)
+            matching_key = song_index.get_matching_key(nom_val)
 
         if matching_key:
             match_nomination(o_nom, i_noms_d[matching_key], match_mode, speculative=speculative)
@@ -502,23 +795,46 @@ def match_year(oscars, imdb):
         unmatched_o_noms += ou
         unmatched_i_noms += iu
 
-    full_scores = []
-    for o_cat in list(unmatched_o_cats):
-        for i_cat in unmatched_i_cats:
-            match_mode = get_match_mode(oscars[o_cat][0])
-            score = match_category(list(oscars[o_cat]), list(imdb[i_cat]), match_mode, speculative=True)
-            if score > 0.0:
-                full_scores.append((score, o_cat, i_cat))
-
-    for score, o_cat, i_cat in sorted(full_scores, reverse=True):
+    # The remaining pairs of categories are matched from the best score down (ties by descending name). The pairs are
+    # queued by an upper bound of their score, and a pair is only scored when it reaches the front of the queue (it
+    # is queued again with its score), so pairs whose categories got matched first are never scored.
+    o_cats = sorted(unmatched_o_cats, reverse=True)
+    i_cats = sorted(unmatched_i_cats, reverse=True)
+    match_modes = {o_cat: get_match_mode(oscars[o_cat][0]) for o_cat in o_cats}
+    prepared = {}
+    memos = collections.defaultdict(dict)
+    queue = []
+    for o_rank, o_cat in enumerate(o_cats):
+        match_mode = match_modes[o_cat]
+        for i_rank, i_cat in enumerate(i_cats):
+            if (i_cat, match_mode) not in prepared:
+                prepared[i_cat, match_mode] = prepare_nominations(imdb[i_cat], match_mode)
+            bound = get_score_bound(oscars[o_cat], imdb[i_cat], match_mode, prepared[i_cat, match_mode])
+            if bound > 0.0:
+                queue.append((-bound, o_rank, i_rank, False))
+    heapq.heapify(queue)
+
+    while queue:
+        negative_score, o_rank, i_rank, scored = heapq.heappop(queue)
+        o_cat = o_cats[o_rank]
+        i_cat = i_cats[i_rank]
         if o_cat not in unmatched_o_cats or i_cat not in unmatched_i_cats:
             continue
+        match_mode = match_modes[o_cat]
+        if not scored:
+            score = match_category(list(oscars[o_cat]), list(imdb[i_cat]), match_mode, speculative=True,
+                                   prepared=prepared[i_cat, match_mode], memo=memos[o_cat, i_cat])
+            if score > 0.0:
+                heapq.heappush(queue, (-score, o_rank, i_rank, True))
+            continue
+
+        score = -negative_score
         if args.category_matching:
             click.secho(f'Fuzzy Category Match: {score:.1f} {o_cat:40s} {i_cat:40s}', bg='blue')
         CATEGORY_STATS['fuzzy'] += 1
 
-        match_mode = get_match_mode(oscars[o_cat][0])
-        ou, iu, = match_category(list(oscars[o_cat]), list(imdb[i_cat]), match_mode)
+        ou, iu, = match_category(list(oscars[o_cat]), list(imdb[i_cat]), match_mode,
+                                 prepared=prepared[i_cat, match_mode], memo=memos[o_cat, i_cat])
         unmatched_o_noms += ou
         unmatched_i_noms += iu
         unmatched_o_cats.remove(o_cat)
@@ -568,6 +884,7 @@ def match_year(oscars, imdb):
                 nominees = o_nom.get('Nominees', '<>')
                 click.secho(f'\t{o_cat:15s} | {film:15s} | {nominees}', fg='yellow')
         if new_i:
+            import yaml
             click.secho('IMDB Noms not matched:', fg='yellow')
             for i_nom in new_i:
                 film = ', '.join(v for (k, v) in i_nom.items() if 'tt' in k and v)
@@ -576,6 +893,34 @@ def match_year(oscars, imdb):
                 click.secho(f'\t{s}', fg='yellow')
 
 
+class CapturedOutput(io.StringIO):
+    """Collects the output of a worker with its colors, which click strips again if the output is not a terminal."""
+
+    def isatty(self):
+        return True
+
+
+def init_worker(options):
+    global args
+    args = options
+
+
+def merge_year(year_oscars, year_imdb):
+    """Match one year in a worker process, returning the updates, the STATS counts and the output."""
+    for stats in STATS:
+        stats.clear()
+    o_noms = [o_nom for noms in year_oscars.values() for o_nom in noms]
+    original = [dict(o_nom) for o_nom in o_noms]
+
+    output = CapturedOutput()
+    with contextlib.redirect_stdout(output):
+        match_year(year_oscars, year_imdb)
+
+    updates = [{k: v for k, v in o_nom.items() if original_nom.get(k) != v}
+               for o_nom, original_nom in zip(o_noms, original)]
+    return updates, [stats.copy() for stats in STATS], output.getvalue()
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('years', nargs='*')
@@ -584,17 +929,20 @@ if __name__ == '__main__':
     parser.add_argument('-s', '--scitech', action='store_true')
     parser.add_argument('-k', '--core', action='store_true')
     parser.add_argument('-w', '--write', action='store_true')
+    parser.add_argument('--matcher', choices=['optimal', 'greedy'], default='optimal',
+                        help='Assign the IMDb nominations to maximize the matches per category, or greedily in order')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='Number of processes to match years')
     args = parser.parse_args()
 
     # Parse the list of years (if any)
     years = parse_years(args.years)
 
     # Sort Oscar Nominations by Year
-    oscars = read_csv()
+    oscars = read_csv(years=years if args.years else None)
     cnums = {}
     OSCARS = {}
-    for nom in oscars:
-        year = parse_year(nom['Year'])
+    for year, nom in zip(oscars.year_numbers, oscars):
         if year not in years:
             if not args.years:
                 years.append(year)
@@ -611,18 +959,13 @@ if __name__ == '__main__':
         cnums[year] = int(nom['Ceremony'])
 
     # Read IMDb Data
-    imdb_data = {}
-    imdb_data_path = pathlib.Path('imdb_data')
+    imdb_data = load_imdb_data(years)
     for year in years:
-        imdb_year_path = imdb_data_path / f'{year}.yaml'
-        if not imdb_year_path.exists():
-            click.secho(f'Cannot find imdb yaml for {year}', fg='red')
-            continue
-
-        imdb_data[year] = yaml.safe_load(open(imdb_year_path))
+        if year not in imdb_data:
+            click.secho(f'Cannot find imdb data for {year}', fg='red')
 
     # Correct IMDB Data
-    for year, cats in yaml.safe_load(open('aux_data/supplemental_imdb_data.yaml')).items():
+    for year, cats in load_aux_data('supplemental_imdb_data').items():
         if year not in imdb_data:
             continue
         awards = imdb_data[year]['awards']
@@ -673,12 +1016,32 @@ if __name__ == '__main__':
                 awards[cat].append(update)
 
     # Match IMDb data with oscars data
-    try:
-        for year in years:
-            click.secho(f'#{cnums[year]}) {year}', fg='blue', bg='white')
-            match_year(OSCARS[year], imdb_data[year]['awards'])
-    except click.Abort:
-        pass
+    if args.jobs > 1 and len(years) > 1:
+        with concurrent.futures.ProcessPoolExecutor(args.jobs, initializer=init_worker, initargs=(args,)) as executor:
+            results = [executor.submit(merge_year, {cat: [dict(o_nom) for o_nom in noms]
+                                                    for cat, noms in OSCARS[year].items()},
+                                       imdb_data[year]['awards'])
+                       for year in years]
+            try:
+                for year, result in zip(years, results):
+                    updates, year_stats, output = result.result()
+                    click.secho(f'#{cnums[year]}) {year}', fg='blue', bg='white')
+                    click.echo(output, nl=False)
+                    o_noms = [o_nom for noms in OSCARS[year].values() for o_nom in noms]
+                    for o_nom, nom_updates in zip(o_noms, updates):
+                        for k, v in nom_updates.items():
+                            o_nom[k] = v
+                    for stats, counts in zip(STATS, year_stats):
+                        stats.update(counts)
+            except click.Abort:
+                executor.shutdown(cancel_futures=True)
+    else:
+        try:
+            for year in years:
+                click.secho(f'#{cnums[year]}) {year}', fg='blue', bg='white')
+                match_year(OSCARS[year], imdb_data[year]['awards'])
+        except click.Abort:
+            pass
 
     # Gather Statistics about the total counts
     denominators = collections.Counter()
@@ -695,7 +1058,7 @@ if __name__ == '__main__':
                     denominators['Songs'] += 1
 
     if args.write:
-        write_csv(oscars)
+        write_csv(oscars, years=years if args.years else None)
 
     if args.write and not args.years:
         f = open('stats.txt', 'w')
@@ -4,7 +4,7 @@ import click
 import pathlib
 import yaml
 
-from utilities import read_csv, write_csv
+from utilities import iter_csv, write_csv, load_aux_data, remove_departments
 
 TRANSITION_WORDS = r'(in recognition|whose|for|in appreciation)'
 MOSTLY_CAPS = re.compile('^[2A-Z].*[A-Z.]$')
@@ -13,8 +13,6 @@ DEDICATION = re.compile(r'To (.*[A-Z]{3,}) ' + TRANSITION_WORDS + r' (.*)')
 DEDICATION2 = re.compile(r'To ([^,:\-]+)[,:\-] (.*)')
 DEDICATION3 = re.compile(r'To (.*),? ' + TRANSITION_WORDS + r' (.*)')
 
-DEPARTMENTS = yaml.safe_load(open('aux_data/departments.yaml'))
-
 
 def get_nominees(cite):
     words = cite.split()
@@ -68,9 +66,7 @@ def parse_citations(entry, nom_key='Nominees', debug=False):
             m = LOWER_MATCH.search(nom)
             if not m:
                 nom = nom.title()
-            for suffix in DEPARTMENTS:
-                nom = nom.replace(suffix, '').strip()
-            new_noms.append(nom)
+            new_noms.append(remove_departments(nom).strip())
         nominees = new_noms
         nom_s = '|'.join(nominees)
         if entry.get(nom_key) and entry[nom_key] != nom_s:
@@ -81,38 +77,39 @@ def parse_citations(entry, nom_key='Nominees', debug=False):
                 click.secho(entry[nom_key], fg='blue')
 
 
+def lookup_citation(nom, citations):
+    """Fill in nom from its saved citation, or parse the citation and save the result."""
+    cite = nom.get('Citation', '')
+    if not cite:
+        return nom
+    year = nom['Year']
+    if year not in citations:
+        citations[year] = {}
+
+    key = get_cite_hash(cite)
+    if key in citations[year]:
+        citation = citations[year][key]
+        saved_cite = citation['Citation']
+        if saved_cite != cite:
+            click.secho(f'Cite Hash Collision! Key: {key} Year: {year}', fg='yellow')
+            click.secho(f'\t{saved_cite}', fg='white')
+            click.secho(f'\t{cite}', fg='white')
+            return nom
+        nom.update(citation)
+    else:
+        click.secho(f'New citation: {year}/{key}', fg='blue')
+        parse_citations(nom)
+        citations[year][key] = {k: v for (k, v) in nom.items() if k in ['Citation', 'Film', 'Nominees'] and v}
+    return nom
+
+
 if __name__ == '__main__':
     citations_path = pathlib.Path('aux_data/citations.yaml')
     if citations_path.exists():
-        citations = yaml.safe_load(open(citations_path))
+        citations = load_aux_data('citations')
     else:
         citations = {}
 
-    o_noms = read_csv()
-
-    for nom in o_noms:
-        cite = nom.get('Citation', '')
-        if not cite:
-            continue
-        year = nom['Year']
-        if year not in citations:
-            citations[year] = {}
-
-        key = get_cite_hash(cite)
-        if key in citations[year]:
-            citation = citations[year][key]
-            saved_cite = citation['Citation']
-            if saved_cite != cite:
-                click.secho(f'Cite Hash Collision! Key: {key} Year: {year}', fg='yellow')
-                click.secho(f'\t{saved_cite}', fg='white')
-                click.secho(f'\t{cite}', fg='white')
-                continue
-            nom.update(citation)
-        else:
-            click.secho(f'New citation: {year}/{key}', fg='blue')
-            parse_citations(nom)
-            citations[year][key] = {k: v for (k, v) in nom.items() if k in ['Citation', 'Film', 'Nominees'] and v}
+    write_csv(lookup_citation(nom, citations) for nom in iter_csv())
 
     yaml.safe_dump(citations, open(citations_path, 'w'), allow_unicode=True)
-
-    write_csv(o_noms)
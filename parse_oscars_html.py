@@ -1,17 +1,31 @@
 #!/usr/bin/python3
 import argparse
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import html
+import os
+import pickle
 import re
 import click
 from tqdm import tqdm
 
 from utilities import find_all_by_class, find_by_class, remove_enclosing, BeautifulParser
-from utilities import read_csv, write_csv, parse_years, parse_year
+from utilities import archive_html, atomic_write, get_cache_path, open_html, parse_timestamp, write_csv
+from utilities import clean_string, parse_years, parse_year
 
 ORDINAL = r'(\d+)(th|st|nd|rd)'
 ORD_TAIL = r'\s+\(' + ORDINAL + r'\)'
 YEAR_PATT = re.compile(r'(\d{4})' + ORD_TAIL)
 YEAR_PATT2 = re.compile(r'(\d{4}/\d{2})' + ORD_TAIL)
 TITLE_PATT = re.compile(r'The ' + ORDINAL + r' Academy Awards\s+\| (\d{4})')
+DIV_TAG_PATT = re.compile(r'<(/?)div\b[^>]*>', re.IGNORECASE)
+CLASS_PATT = re.compile(r'\bclass\s*=\s*["\']([^"\']*)["\']', re.IGNORECASE)
+TAG_PATT = re.compile(r'<[^>]*>')
+
+# Bump whenever the parsing changes, so that the cached rows of unchanged blocks are parsed again
+PARSER_VERSION = 1
 
 SPECIAL_PARSE = [
     re.compile(r'^(?P<Name>[^-]+) -- (?P<Film>.*) \{"(?P<Detail>.*)"\}'),
@@ -34,13 +48,6 @@ NOTABLE_FIELDS = {
 }
 
 
-def clean_string(text):
-    text = text.replace('\n', ' ')
-    while '  ' in text:
-        text = text.replace('  ', ' ')
-    return text
-
-
 def add_value(d, key, value):
     if key in d:
         if isinstance(d[key], str):
@@ -50,29 +57,67 @@ def add_value(d, key, value):
         d[key] = value
 
 
+def clean_award_text(text):
+    text = text.strip()
+    if text and text[-1] == ';':
+        text = text[:-1]
+    return clean_string(remove_enclosing(text))
+
+
+class ExtractionSchema:
+    """Which fields the text of the divs in an element fill in, keyed by the classes of the divs."""
+
+    def __init__(self, fields, prefix='', clean=str.strip, overrides=None):
+        self.clean = clean
+        self.lookups = {None: self.compile(fields, prefix)}
+        for variant, override in (overrides or {}).items():
+            self.lookups[variant] = self.compile({**fields, **override}, prefix)
+
+    @staticmethod
+    def compile(fields, prefix):
+        lookup = {}
+        for cls, target in fields.items():
+            lookup[cls] = target
+            lookup[prefix + cls] = target
+        return lookup
+
+    def extract(self, element, row, variant=None):
+        """Add the values of the fields found in the divs below element to row, in document order."""
+        lookup = self.lookups.get(variant, self.lookups[None])
+        for div in element.descendants:
+            if div.name != 'div':
+                continue
+            classes = div.get('class')
+            if not classes or lookup.keys().isdisjoint(classes):
+                continue
+            text = self.clean(div.text)
+            if not text:
+                continue
+            for cls in classes:
+                target = lookup.get(cls)
+                if target is None:
+                    continue
+                elif callable(target):
+                    target(row, text)
+                else:
+                    add_value(row, target, text)
+        return row
+
+
+AWARD_SCHEMA = ExtractionSchema(NOTABLE_FIELDS, 'awards-result-', clean_award_text)
+
+
 def parse_award(award_html):
     award_info = {}
     if find_by_class(award_html, 'span', 'glyphicon-star'):
         award_info['Winner'] = True
 
-    for div in award_html.find_all('div'):
-        if isinstance(div, str):
-            continue
-        div_text = div.text.strip()
-        if div_text and div_text[-1] == ';':
-            div_text = div_text[:-1]
-        div_text = clean_string(remove_enclosing(div_text))
-        if not div_text:
-            continue
-        for cls in div['class']:
-            cls = cls.replace('awards-result-', '')
-            if cls not in NOTABLE_FIELDS:
-                continue
-            cat = NOTABLE_FIELDS[cls]
-
-            add_value(award_info, cat, div_text)
+    AWARD_SCHEMA.extract(award_html, award_info)
 
     if not award_info:
+        # Fall back on the text of the last div
+        divs = award_html.find_all('div')
+        div_text = clean_award_text(divs[-1].text) if divs else ''
         for special_pattern in SPECIAL_PARSE:
             m = special_pattern.match(div_text)
             if m:
@@ -88,33 +133,161 @@ def parse_award(award_html):
     return award_info
 
 
-def parse_awards(filepath, years=None):
-    html = BeautifulParser(open(filepath))
-    bar = tqdm(html.find_all_by_class('div', 'awards-result-chron'))
-    for row in bar:
-        header = find_by_class(row, 'div', 'result-group-header')
-        year_text = header.text.strip()
-        m = YEAR_PATT.match(year_text) or YEAR_PATT2.match(year_text)
-        if not m:
-            click.secho(f'Cannot parse year text: "{year_text}"', fg='red')
-            exit(-1)
-        year = m.group(1)
-        year_i = parse_year(year)
-        if years and year_i not in years:
-            continue
-        bar.set_description(year)
-        ceremony = int(m.group(2))
-
-        for category_div in find_all_by_class(row, 'div', 'result-subgroup'):
-            category = clean_string(find_by_class(category_div, 'div', 'result-subgroup-title').text.strip())
-
-            category_dict = {'Category': category, 'Year': year, 'Ceremony': ceremony}
-
-            for award_html in find_all_by_class(category_div, 'div', 'result-details'):
-                award_info = parse_award(award_html)
-                award_info.update(category_dict)
+def get_classes(tag):
+    m = CLASS_PATT.search(tag)
+    return m.group(1).split() if m else []
+
+
+def iter_year_blocks(filepath, chunk_size=1 << 20, as_of=None):
+    """Yield the html of each awards-result-chron div in the file, one at a time."""
+    buffer = ''
+    pos = 0
+    start = 0
+    depth = 0  # How many divs deep we are in the current block, 0 if outside of a block
+    with open_html(filepath, as_of) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            buffer += chunk
+            for m in DIV_TAG_PATT.finditer(buffer, pos):
+                pos = m.end()
+                if m.group(1):
+                    if depth:
+                        depth -= 1
+                        if depth == 0:
+                            yield buffer[start:pos]
+                elif depth:
+                    depth += 1
+                elif 'awards-result-chron' in get_classes(m.group(0)):
+                    start = m.start()
+                    depth = 1
+
+            # Drop everything that has been fully scanned and is not part of the current block
+            keep = start if depth else pos
+            buffer = buffer[keep:]
+            pos -= keep
+            start -= keep
+            if not chunk:
+                return
+
+
+def get_block_year_text(block_html):
+    """Extract the text of the result-group-header from the raw html without parsing the whole block."""
+    for m in DIV_TAG_PATT.finditer(block_html):
+        if not m.group(1) and 'result-group-header' in get_classes(m.group(0)):
+            end = block_html.find('</div', m.end())
+            return html.unescape(TAG_PATT.sub('', block_html[m.end():end])).strip()
+
+
+def skip_block(block_html, years):
+    """Whether the block is for a year outside of years, judging from its raw html."""
+    if not years:
+        return False
+    year_text = get_block_year_text(block_html)
+    m = year_text and (YEAR_PATT.match(year_text) or YEAR_PATT2.match(year_text))
+    return bool(m) and parse_year(m.group(1)) not in years
+
+
+def parse_year_block(block_html, years=None):
+    row = BeautifulParser(block_html).find_by_class('div', 'awards-result-chron')
+    header = find_by_class(row, 'div', 'result-group-header')
+    year_text = header.text.strip()
+    m = YEAR_PATT.match(year_text) or YEAR_PATT2.match(year_text)
+    if not m:
+        click.secho(f'Cannot parse year text: "{year_text}"', fg='red')
+        exit(-1)
+    year = m.group(1)
+    year_i = parse_year(year)
+    if years and year_i not in years:
+        return []
+    ceremony = int(m.group(2))
+
+    awards = []
+    for category_div in find_all_by_class(row, 'div', 'result-subgroup'):
+        category = clean_string(find_by_class(category_div, 'div', 'result-subgroup-title').text.strip())
+
+        category_dict = {'Category': category, 'Year': year, 'Ceremony': ceremony}
+
+        for award_html in find_all_by_class(category_div, 'div', 'result-details'):
+            award_info = parse_award(award_html)
+            award_info.update(category_dict)
+
+            awards.append(award_info)
+    return awards
+
+
+def get_digest(html_s):
+    return hashlib.blake2b(html_s.encode(), digest_size=16).hexdigest()
+
+
+def load_parsed_blocks(filepath):
+    """Return the rows parsed from filepath in earlier runs, keyed by the digest of the html they came from."""
+    try:
+        with open(get_cache_path(filepath, 'blocks'), 'rb') as f:
+            cache = pickle.load(f)
+        if cache['version'] == PARSER_VERSION:
+            return cache['blocks']
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError):
+        pass
+    return {}
+
+
+def save_parsed_blocks(filepath, blocks):
+    try:
+        with atomic_write(get_cache_path(filepath, 'blocks'), 'wb') as f:
+            pickle.dump({'version': PARSER_VERSION, 'blocks': blocks}, f, pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        pass
+
+
+def prefetch(items, size):
+    """Yield the items in order, taking up to size of them from the iterator ahead of time."""
+    pending = collections.deque()
+    for item in items:
+        pending.append(item)
+        if len(pending) >= size:
+            yield pending.popleft()
+    yield from pending
+
+
+def parse_awards(filepath, years=None, jobs=1, force=False, as_of=None):
+    cached = load_parsed_blocks(filepath)
+    parsed = {}
+
+    with contextlib.ExitStack() as stack:
+        executor = stack.enter_context(concurrent.futures.ProcessPoolExecutor(jobs)) if jobs > 1 else None
+
+        def get_results():
+            for block_html in iter_year_blocks(filepath, as_of=as_of):
+                digest = get_digest(block_html)
+                # Skip the years we don't want before any html is parsed (or sent to another process)
+                if skip_block(block_html, years):
+                    if digest in cached:
+                        parsed[digest] = cached[digest]
+                elif digest in cached and not force:
+                    yield digest, cached[digest]
+                elif executor:
+                    yield digest, executor.submit(parse_year_block, block_html)
+                else:
+                    yield digest, parse_year_block(block_html)
+
+        results = get_results()
+        if executor:
+            # Keep a couple of blocks per process in flight, so that the pool stays busy without the whole document
+            # waiting in its queue
+            results = prefetch(results, 2 * jobs)
+
+        bar = tqdm(results, unit=' years')
+        for digest, awards in bar:
+            if isinstance(awards, concurrent.futures.Future):
+                awards = awards.result()
+            parsed[digest] = awards
+            if not awards or (years and parse_year(awards[0]['Year']) not in years):
+                continue
+            bar.set_description(awards[0]['Year'])
+            for award_info in awards:
+                yield dict(award_info)
 
-                yield award_info
+    save_parsed_blocks(filepath, parsed)
 
 
 SONG_PATTERN = re.compile(r'from ([^;]+); (.*)')
@@ -129,8 +302,40 @@ OTHER_FIELDS = {
 }
 
 
-def parse_nominations(filepath):
-    html = BeautifulParser(open(filepath))
+def add_song_credits(nomination, text):
+    m = SONG_PATTERN.match(text)
+    add_value(nomination, 'Film', m.group(1))
+    add_value(nomination, 'Name', m.group(2))
+
+
+SONG_FIELDS = {
+    'field--name-field-award-film': 'Detail',
+    'field--name-field-award-entities': add_song_credits,
+}
+NOMINATION_SCHEMA = ExtractionSchema(OTHER_FIELDS, 'views-field-', overrides={
+    'International Feature Film': INTERNATIONAL_FIELDS,
+    'Music (Original Song)': SONG_FIELDS,
+})
+
+
+def parse_nominations(filepath, force=False, as_of=None):
+    with open_html(filepath, as_of) as f:
+        html_s = f.read()
+    digest = get_digest(html_s)
+
+    cached = load_parsed_blocks(filepath)
+    if digest in cached and not force:
+        nominations = cached[digest]
+    else:
+        nominations = list(parse_nominations_html(html_s))
+        save_parsed_blocks(filepath, {digest: nominations})
+
+    for nomination in nominations:
+        yield dict(nomination)
+
+
+def parse_nominations_html(html_s):
+    html = BeautifulParser(html_s)
 
     title = html.find_by_class('div', 'field--name-title').text.strip()
     m = TITLE_PATT.search(title)
@@ -142,30 +347,9 @@ def parse_nominations(filepath):
         if not cat_head:
             continue
         category = cat_head.text
-        FIELDS = INTERNATIONAL_FIELDS if category == 'International Feature Film' else OTHER_FIELDS
         for nom_el in find_all_by_class(row, 'div', 'paragraph--type--award-honoree'):
             nomination = {'Category': category, 'Ceremony': ceremony, 'Year': year}
-            for div in nom_el.find_all('div'):
-                if isinstance(div, str):
-                    continue
-                div_text = div.text.strip()
-                if not div_text:
-                    continue
-                for cls in div['class']:
-                    cls = cls.replace('views-field-', '')
-                    if cls not in FIELDS:
-                        continue
-                    cat = FIELDS[cls]
-                    if category == 'Music (Original Song)':
-                        if cls == 'field--name-field-award-film':
-                            cat = 'Detail'
-                        else:
-                            m = SONG_PATTERN.match(div_text)
-                            add_value(nomination, 'Film', m.group(1))
-                            add_value(nomination, 'Name', m.group(2))
-                            continue
-                    add_value(nomination, cat, div_text)
-
+            NOMINATION_SCHEMA.extract(nom_el, nomination, category)
             yield nomination
 
 
@@ -173,35 +357,24 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('years', nargs='*')
     parser.add_argument('-n', '--parse-nominations', action='store_true')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='Number of processes for parsing')
+    parser.add_argument('-f', '--force', action='store_true', help='Parse every block again')
+    parser.add_argument('--as-of', type=parse_timestamp, help='Parse the pages archived before this date/time')
     args = parser.parse_args()
 
-    if args.years:
-        years = parse_years(args.years)
-        original_awards = read_csv()
-        select_awards = list(parse_awards('oscars_html/search_results.html', years))
-        awards = []
-        while original_awards or select_awards:
-            while original_awards and parse_year(original_awards[0]['Year']) in years:
-                original_awards.pop(0)
-
-            if original_awards:
-                if select_awards:
-                    o_year = parse_year(original_awards[0]['Year'])
-                    s_year = parse_year(select_awards[0]['Year'])
-                    if o_year < s_year:
-                        awards.append(original_awards.pop(0))
-                    else:
-                        awards.append(select_awards.pop(0))
-                else:
-                    awards.append(original_awards.pop(0))
-            else:
-                awards.append(select_awards.pop(0))
-    else:
-        awards = list(parse_awards('oscars_html/search_results.html'))
+    search_path = 'oscars_html/search_results.html'
+    nominations_path = 'oscars_html/nominations.html'
+    if not args.as_of:
+        # Keep every version of the exports that gets parsed
+        for filepath in archive_html([search_path, nominations_path]):
+            click.secho(f'Archived a new version of {filepath}', fg='blue')
+
+    years = parse_years(args.years) or None
+    awards = list(parse_awards(search_path, years, args.jobs, args.force, args.as_of))
 
     if args.parse_nominations:
-        awards += parse_nominations('oscars_html/nominations.html')
+        awards += parse_nominations(nominations_path, args.force, args.as_of)
 
     click.secho(f'Parsed {len(awards)} nominations.', fg='blue')
 
-    write_csv(awards)
+    write_csv(awards, years=years)
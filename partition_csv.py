@@ -0,0 +1,60 @@
+#!/usr/bin/python3
+import argparse
+import click
+import csv
+import hashlib
+
+from utilities import CSV_FORMAT, atomic_write, get_partition_path, iter_csv, read_manifest, write_partitions
+
+PARTITIONS_PATH = 'ceremonies'
+
+
+def split(filepath, folder):
+    write_partitions(iter_csv(filepath), folder)
+
+
+def assemble(folder, filepath):
+    """Concatenate the partitions (in ceremony order) back into one csv, without parsing them."""
+    with atomic_write(filepath) as f:
+        for i, key in enumerate(read_manifest(folder)['partitions']):
+            with open(get_partition_path(folder, key)) as partition:
+                header = partition.readline()
+                if i == 0:
+                    f.write(header)
+                f.write(partition.read())
+
+
+def check(folder):
+    """Return the keys of the partitions that do not match their row counts/hashes in the manifest."""
+    bad = []
+    for key, partition in read_manifest(folder)['partitions'].items():
+        path = get_partition_path(folder, key)
+        if not path.exists():
+            bad.append(key)
+            continue
+        contents = path.read_bytes()
+        rows = sum(1 for record in csv.reader(contents.decode().splitlines(keepends=True), **CSV_FORMAT)) - 1
+        if hashlib.blake2b(contents, digest_size=16).hexdigest() != partition['hash'] or rows != partition['rows']:
+            bad.append(key)
+    return bad
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Convert between oscars.csv and one tsv per ceremony')
+    parser.add_argument('command', choices=['split', 'assemble', 'check'])
+    parser.add_argument('-c', '--csv', default='oscars.csv')
+    parser.add_argument('-p', '--partitions', default=PARTITIONS_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'split':
+        split(args.csv, args.partitions)
+        click.secho(f'Wrote {len(read_manifest(args.partitions)["partitions"])} partitions', fg='blue')
+    elif args.command == 'assemble':
+        assemble(args.partitions, args.csv)
+    else:
+        bad = check(args.partitions)
+        for key in bad:
+            click.secho(f'{get_partition_path(args.partitions, key)} does not match the manifest', fg='red')
+        if bad:
+            exit(-1)
+        click.secho('All partitions match the manifest', fg='green')
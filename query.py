@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+import argparse
+import click
+from array import array
+
+from utilities import DATA_PATH, get_cache_source, read_csv, load_csv_cache, save_csv_cache, parse_years, split_ids
+
+# Maps the keyword arguments of OscarsIndex.query to the fields they look up
+QUERY_FIELDS = {
+    'nominee': 'NomineeIds',
+    'film': 'FilmId',
+    'year': 'Year',
+    'ceremony': 'Ceremony',
+    'category': 'CanonicalCategory',
+    'class_name': 'Class',
+}
+
+
+class OscarsIndex:
+    """Inverted indexes from the values of the QUERY_FIELDS to the positions of the rows."""
+
+    def __init__(self, table, indexes=None):
+        self.table = table
+        if indexes is None:
+            indexes = self.build_indexes(table)
+        self.indexes = indexes
+
+    @staticmethod
+    def build_indexes(table):
+        indexes = {field: {} for field in QUERY_FIELDS.values()}
+
+        def add(field, key, i):
+            positions = indexes[field].get(key)
+            if positions is None:
+                positions = indexes[field][key] = array('I')
+            positions.append(i)
+
+        columns = table.columns
+        for i in range(len(table)):
+            for field in ['NomineeIds', 'FilmId']:
+                for value in split_ids(columns[field][i]):
+                    if value and value != '?':
+                        add(field, value, i)
+            add('Year', table.year_numbers[i], i)
+            add('Ceremony', columns['Ceremony'].ints[i], i)
+            add('CanonicalCategory', columns['CanonicalCategory'][i], i)
+            add('Class', columns['Class'][i], i)
+        return indexes
+
+    @classmethod
+    def load(cls, filepath=DATA_PATH):
+        """Read the csv and its indexes, using the cached copies while the csv is unchanged."""
+        table = read_csv(filepath)
+        cache_source = get_cache_source(filepath)
+        indexes = load_csv_cache(cache_source, 'index')
+        if indexes is None:
+            index = cls(table)
+            save_csv_cache(cache_source, index.indexes, 'index')
+            return index
+        return cls(table, indexes)
+
+    def positions(self, field, values):
+        """Return the positions of the rows where field has any of the values."""
+        index = self.indexes[field]
+        positions = set()
+        for value in values:
+            positions.update(index.get(value, []))
+        return positions
+
+    def query(self, winner=None, **criteria):
+        """Return the rows matching all of the criteria, e.g. query(nominee='nm0000110', winner=True)."""
+        matches = None
+        for key, values in criteria.items():
+            if values is None:
+                continue
+            if isinstance(values, (str, int)):
+                values = [values]
+            positions = self.positions(QUERY_FIELDS[key], values)
+            matches = positions if matches is None else matches.intersection(positions)
+
+        if matches is None:
+            matches = range(len(self.table))
+        rows = [self.table[i] for i in sorted(matches)]
+        if winner is not None:
+            rows = [row for row in rows if bool(row['Winner']) == winner]
+        return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('years', nargs='*')
+    parser.add_argument('-n', '--nominee', action='append', help='IMDb name/company id')
+    parser.add_argument('-f', '--film', action='append', help='IMDb title id')
+    parser.add_argument('-c', '--category', action='append', help='Canonical category')
+    parser.add_argument('-l', '--class', dest='class_name', action='append')
+    parser.add_argument('-e', '--ceremony', action='append', type=int)
+    parser.add_argument('-w', '--winner', action='store_true')
+    args = parser.parse_args()
+
+    index = OscarsIndex.load()
+    rows = index.query(nominee=args.nominee, film=args.film, category=args.category, class_name=args.class_name,
+                       ceremony=args.ceremony, year=parse_years(args.years) or None,
+                       winner=True if args.winner else None)
+
+    for row in rows:
+        film = row['Film'] or '[NO FILM]'
+        name = row['Name'] or row['Nominees']
+        click.secho(f'{row["Year"]:7s} {row["CanonicalCategory"]:40s} {film} | {name}',
+                    fg='green' if row['Winner'] else None)
+    click.secho(f'{len(rows)} nominations', fg='blue')
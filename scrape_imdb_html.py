@@ -1,31 +1,147 @@
 #!/usr/bin/python3
 import argparse
+import concurrent.futures
+import functools
+import io
+import os
 import re
+import threading
+import time
 import yaml
 import json
 import pathlib
-import requests
 import click
 from tqdm import tqdm
 
-WIDGET_PATTERN = re.compile(r'<script id="__NEXT_DATA__" type="application/json">(.*)</script>')
+from utilities import IMDB_DATA_PATH, HtmlArchive, atomic_write, get_html_digest, open_html, parse_timestamp
+from utilities import read_imdb_sources, read_imdb_store, write_imdb_store
+
+# Bump whenever the parsing changes, so that every page is parsed again
+PARSER_VERSION = 1
+
+NEXT_DATA_TAG = '<script id="__NEXT_DATA__" type="application/json">'
+PAGE_PROPS_KEY = '"pageProps":'
+JSON_DECODER = json.JSONDecoder()
 SONG_PATTERNS = [
     re.compile(r'[Ss]ong:? "([^"]*)"'),
     re.compile(r'For "([^"]*)"'),
 ]
 
+IMDB_EVENT_URL = 'https://www.imdb.com/event/ev0000003/'
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 '
+                         '(KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36'}
+VALIDATORS_NAME = '.validators.json'
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+class RateLimiter:
+    """Space out the start of requests (across threads) so there are at most rate per second."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Downloader:
+    """Downloads pages into a folder, with retries, revalidation and a rate limit."""
+
+    def __init__(self, folder, concurrency=8, rate=5, retries=4, backoff=0.5, timeout=30):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        self.folder = pathlib.Path(folder)
+        self.archive = HtmlArchive(folder)
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate)
+
+        try:
+            self.validators = json.loads((self.folder / VALIDATORS_NAME).read_text())
+        except (OSError, ValueError):
+            self.validators = {}
+
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=RETRY_STATUSES)
+        adapter = HTTPAdapter(pool_maxsize=concurrency, max_retries=retry)
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url, filename):
+        """Download url into filename, returning whether the file changed."""
+        path = self.folder / filename
+        headers = {}
+        if path.exists() or filename in self.archive:
+            validators = self.validators.get(filename, {})
+            if 'etag' in validators:
+                headers['If-None-Match'] = validators['etag']
+            if 'last_modified' in validators:
+                headers['If-Modified-Since'] = validators['last_modified']
+
+        self.limiter.wait()
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+
+        with atomic_write(path, 'wb') as f:
+            f.write(response.content)
+        self.archive.add(filename, io.BytesIO(response.content))
+        validators = {}
+        if 'ETag' in response.headers:
+            validators['etag'] = response.headers['ETag']
+        if 'Last-Modified' in response.headers:
+            validators['last_modified'] = response.headers['Last-Modified']
+        self.validators[filename] = validators
+        return True
+
+    def download(self, pages):
+        """Fetch each of the (url, filename) pairs concurrently, returning the filenames that changed."""
+        import requests
+
+        changed = []
+        with concurrent.futures.ThreadPoolExecutor(self.concurrency) as executor:
+            futures = {executor.submit(self.fetch, url, filename): filename for url, filename in pages}
+            for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), unit=' pages'):
+                filename = futures[future]
+                try:
+                    if future.result():
+                        changed.append(filename)
+                except requests.RequestException as e:
+                    click.secho(f'Unable to download {filename}: {e}', fg='red')
+
+        with atomic_write(self.folder / VALIDATORS_NAME) as f:
+            json.dump(self.validators, f, indent=2, sort_keys=True)
+        self.archive.save()
+        return sorted(changed)
+
+
+def get_page_props(s):
+    """Decode props.pageProps from the __NEXT_DATA__ script of the page."""
+    start = s.index(NEXT_DATA_TAG) + len(NEXT_DATA_TAG)
+    end = s.index('</script>', start)
+    i = s.find(PAGE_PROPS_KEY, start, end)
+    if i != -1 and ''.join(s[start:i].split()) == '{"props":{':
+        i = json.decoder.WHITESPACE.match(s, i + len(PAGE_PROPS_KEY)).end()
+        page_props, i = JSON_DECODER.raw_decode(s, i)
+        if i <= end:
+            return page_props
+    return json.loads(s[start:end])['props']['pageProps']
+
 
 def parse_imdb_html(s):
     D = {'awards': {}}
-    m = WIDGET_PATTERN.search(s)
-    data_s = m.group(1)
-    needle = '</script>'
-    if needle in data_s:
-        i = data_s.index(needle)
-        data_s = data_s[:i]
-
-    ddd = json.loads(data_s)
-    edition = ddd['props']['pageProps']
+    edition = get_page_props(s)
     edition_info = edition['editionInfo']
     D['id'] = edition_info['id']
     D['year'] = edition_info['year']
@@ -83,14 +199,33 @@ def parse_imdb_html(s):
     return D
 
 
+def parse_imdb_file(path, as_of=None):
+    with open_html(path, as_of) as f:
+        return parse_imdb_html(f.read())
+
+
+def parse_imdb_files(paths, jobs=1, as_of=None):
+    """Parse each of the pages, returning the results in the same order. Uses a pool of processes if jobs > 1."""
+    parse = functools.partial(parse_imdb_file, as_of=as_of)
+    if jobs <= 1:
+        return [parse(path) for path in tqdm(paths)]
+    with concurrent.futures.ProcessPoolExecutor(jobs) as executor:
+        return list(tqdm(executor.map(parse, paths, chunksize=4), total=len(paths)))
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
-    parser.add_argument('-f', '--force', action='store_true')
+    parser.add_argument('-f', '--force', action='store_true', help='Check every page for changes')
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help='Maximum simultaneous downloads')
+    parser.add_argument('-r', '--rate', type=float, default=5, help='Maximum downloads started per second')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='Number of processes for parsing')
+    parser.add_argument('--base-url', default=IMDB_EVENT_URL)
+    parser.add_argument('--as-of', type=parse_timestamp, help='Parse the pages archived before this date/time '
+                        'instead of downloading any')
+    parser.add_argument('--reparse', action='store_true', help='Parse every page again, even if unchanged')
     args = parser.parse_args()
 
-    imdb_data = {}
     years = range(1927, 2026)
-    pbar = tqdm(years)
 
     EDGE_CASE_URLS = {
         # Oscars year : Imdb URL
@@ -106,35 +241,61 @@ if __name__ == '__main__':
 
     imdb_src = pathlib.Path('imdb_src')
     imdb_src.mkdir(exist_ok=True)
-    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 '
-                             '(KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36'}
 
-    for year in pbar:
-        pbar.set_description(str(year))
+    pages = {}
+    for year in years:
         year_s = EDGE_CASE_URLS.get(year, f'{year + 1}/1')
-        if not year_s:
-            continue
-        url = f'https://www.imdb.com/event/ev0000003/{year_s}/?ref_=ev_eh'
-        fn = imdb_src / f'{year}.html'
-        if not fn.exists() or args.force:
-            click.secho(f'Downloading {url}...', fg='blue')
-            req = requests.get(url, headers=headers)
-            with open(fn, 'wb') as f:
-                f.write(req.content)
-        s = open(fn).read()
-        D = parse_imdb_html(s)
-
-        if D:
-            imdb_data[year] = D
-
-    def find_category(nom_id, year):
-        for cat, data in imdb_data[year].items():
-            if nom_id in data:
-                return cat
-
-    imdb_data_path = pathlib.Path('imdb_data')
-    imdb_data_path.mkdir(exist_ok=True)
-
-    for year in imdb_data:
-        destination_path = imdb_data_path / f'{year}.yaml'
+        if year_s:
+            pages[year] = f'{args.base_url}{year_s}/?ref_=ev_eh'
+
+    def is_cached(year):
+        return (imdb_src / f'{year}.html').exists() or f'{year}.html' in archive
+
+    archive = HtmlArchive(imdb_src)
+    downloads = [(url, f'{year}.html') for year, url in pages.items() if args.force or not is_cached(year)]
+    if downloads and not args.as_of:
+        click.secho(f'Downloading {len(downloads)} pages...', fg='blue')
+        downloader = Downloader(imdb_src, args.concurrency, args.rate)
+        changed = downloader.download(downloads)
+        click.secho(f'{len(changed)} pages changed', fg='blue')
+        archive = downloader.archive
+
+    if args.as_of:
+        src_years = [year for year in pages if archive.find(f'{year}.html', args.as_of)]
+        if not src_years:
+            click.secho(f'No pages were archived before {args.as_of}', fg='red')
+            exit(-1)
+    else:
+        src_years = [year for year in pages if is_cached(year)]
+
+    # Only parse the pages that changed (or were parsed by another version of the parser) since the last run
+    sources = {year: (get_html_digest(imdb_src / f'{year}.html', args.as_of, archive), PARSER_VERSION)
+               for year in src_years}
+    stored = {} if args.reparse else read_imdb_sources()
+    changed_years = [year for year in src_years if stored.get(year) != sources[year]]
+    # A page missing as of an earlier date is not gone, so only drop years when parsing the current pages
+    removed_years = [] if args.as_of else [year for year in stored if year not in sources]
+
+    parsed = parse_imdb_files([imdb_src / f'{year}.html' for year in changed_years], args.jobs, args.as_of)
+    imdb_data = {year: D for year, D in zip(changed_years, parsed) if D}
+    write_imdb_store(imdb_data, sources, years=changed_years + removed_years)
+
+    # The yaml files are a human readable view of the same data
+    IMDB_DATA_PATH.mkdir(exist_ok=True)
+    for year in removed_years:
+        (IMDB_DATA_PATH / f'{year}.yaml').unlink(missing_ok=True)
+    missing_years = [year for year in src_years
+                     if year not in changed_years and not (IMDB_DATA_PATH / f'{year}.yaml').exists()]
+    if missing_years:
+        imdb_data.update(read_imdb_store(missing_years))
+    for year in sorted(imdb_data):
+        destination_path = IMDB_DATA_PATH / f'{year}.yaml'
         yaml.safe_dump(imdb_data[year], open(destination_path, 'w'), allow_unicode=True)
+
+    changed_years = sorted(changed_years + removed_years)
+    if changed_years:
+        years_s = ' '.join(map(str, changed_years))
+        click.secho(f'{len(changed_years)} years changed: {years_s}', fg='blue')
+        click.secho(f'Merge them with ./merge.py -w {years_s}', fg='blue')
+    else:
+        click.secho('No years changed', fg='blue')
@@ -1,9 +1,28 @@
-import bs4
+from array import array
 import click
+import collections
+import collections.abc
+import contextlib
 import csv
-import yaml
+import datetime
+import functools
+import gzip
+import hashlib
+import heapq
+import io
+import json
+import os
+import pathlib
+import pickle
+import re
+import shutil
+import sys
+import tempfile
+import threading
 
-DATA_PATH = 'oscars.csv'
+# Either the monolithic csv or a folder with the partitioned layout (see write_partitions)
+DATA_PATH = os.environ.get('OSCARS_DATA_PATH', 'oscars.csv')
+MANIFEST_NAME = 'manifest.json'
 
 FIELDNAMES = [
     'Ceremony',
@@ -22,49 +41,514 @@ FIELDNAMES = [
     'Citation',
 ]
 
+CSV_FORMAT = {'delimiter': '\t', 'doublequote': False, 'escapechar': '\\'}
 
-def read_csv(filepath=DATA_PATH):
-    awards = []
-    for row in csv.DictReader(open(filepath), delimiter='\t', doublequote=False, escapechar='\\'):
-        for k, v in row.items():
-            if not v:
-                row[k] = ''
-        awards.append(row)
-    return awards
+# Bump whenever the layout of the pickled caches changes to invalidate them
+CACHE_VERSION = 1
+
+AUX_DATA_PATH = pathlib.Path('aux_data')
+AUX_DATA = {}
+
+IMDB_DATA_PATH = pathlib.Path('imdb_data')
+IMDB_STORE_PATH = pathlib.Path('imdb_data.sqlite')
+ARCHIVE_NAME = 'archive'
+
+# Bump whenever the layout of the IMDb store changes, so that older stores are ignored until scraped again
+IMDB_STORE_VERSION = 2
+
+
+class CategoricalColumn:
+    """Dictionary-encoded strings: each distinct value is stored once and rows hold a small integer code."""
+
+    def __init__(self):
+        self.values = []
+        self.lookup = {}
+        self.codes = array('H')
+
+    def encode(self, value):
+        value = str(value)
+        code = self.lookup.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(sys.intern(value))
+            self.lookup[value] = code
+        return code
+
+    def append(self, value):
+        self.codes.append(self.encode(value))
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def __setitem__(self, i, value):
+        self.codes[i] = self.encode(value)
+
+    def __len__(self):
+        return len(self.codes)
+
+
+class IntColumn:
+    """Small integers stored in an array, handed out as the strings found in the csv ('' for 0)."""
+
+    def __init__(self):
+        self.ints = array('H')
+
+    def append(self, value):
+        self.ints.append(int(value) if value else 0)
+
+    def __getitem__(self, i):
+        value = self.ints[i]
+        return str(value) if value else ''
+
+    def __setitem__(self, i, value):
+        self.ints[i] = int(value) if value else 0
+
+    def __len__(self):
+        return len(self.ints)
+
+
+class FlagColumn:
+    """Boolean column packed into a bitmap, handed out as 'True' or ''."""
+
+    def __init__(self):
+        self.bits = bytearray()
+        self.size = 0
+
+    def append(self, value):
+        if self.size % 8 == 0:
+            self.bits.append(0)
+        self.size += 1
+        self[self.size - 1] = value
+
+    def __getitem__(self, i):
+        return 'True' if self.bits[i >> 3] & (1 << (i & 7)) else ''
+
+    def __setitem__(self, i, value):
+        if value and value != 'False':
+            self.bits[i >> 3] |= 1 << (i & 7)
+        else:
+            self.bits[i >> 3] &= ~(1 << (i & 7))
+
+    def __len__(self):
+        return self.size
+
+
+class TextColumn(list):
+    """Free text, with repeated strings interned. Non-string values (i.e. lists) are kept as assigned."""
+
+    def append(self, value):
+        list.append(self, sys.intern(value) if isinstance(value, str) else value)
+
+    def __setitem__(self, i, value):
+        list.__setitem__(self, i, sys.intern(value) if isinstance(value, str) else value)
+
+
+COLUMN_TYPES = {
+    'Ceremony': IntColumn,
+    'Year': CategoricalColumn,
+    'Class': CategoricalColumn,
+    'CanonicalCategory': CategoricalColumn,
+    'Category': CategoricalColumn,
+    'Winner': FlagColumn,
+}
+
+
+class OscarsRow(collections.abc.MutableMapping):
+    """Lightweight view of one row of an OscarsTable that behaves like the dicts from csv.DictReader."""
+
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table, index):
+        self.table = table
+        self.index = index
+
+    def __getitem__(self, key):
+        return self.table.columns[key][self.index]
+
+    def __setitem__(self, key, value):
+        self.table.columns[key][self.index] = value
+
+    def __delitem__(self, key):
+        raise TypeError(f'Cannot remove the {key} field from an OscarsTable row')
+
+    def __iter__(self):
+        return iter(self.table.columns)
+
+    def __len__(self):
+        return len(self.table.columns)
+
+    def __repr__(self):
+        return f'OscarsRow({dict(self)})'
+
+
+class OscarsTable:
+    """Column-oriented storage for the rows of oscars.csv."""
+
+    def __init__(self, rows=None):
+        self.columns = {field: COLUMN_TYPES.get(field, TextColumn)() for field in FIELDNAMES}
+        self.year_numbers = array('H')
+        if rows is not None:
+            self.extend(rows)
+
+    def append(self, row):
+        for field, column in self.columns.items():
+            column.append(row.get(field) or '')
+        self.year_numbers.append(parse_year(str(row['Year'])))
+        return OscarsRow(self, len(self.year_numbers) - 1)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def extend_records(self, fields, records):
+        """Append rows given as sequences of strings in the order of fields (i.e. straight from csv.reader)."""
+        columns = [self.columns[field] for field in fields]
+        missing = [column for field, column in self.columns.items() if field not in fields]
+        year_i = fields.index('Year')
+        for record in records:
+            for column, value in zip(columns, record):
+                column.append(value)
+            for column in columns[len(record):] + missing:
+                column.append('')
+            self.year_numbers.append(parse_year(record[year_i]))
+
+    def __len__(self):
+        return len(self.year_numbers)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [OscarsRow(self, j) for j in range(len(self))[i]]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('OscarsTable index out of range')
+        return OscarsRow(self, i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield OscarsRow(self, i)
+
+    def select(self, years):
+        """Return the rows whose starting year is in years."""
+        years = set(years)
+        return [OscarsRow(self, i) for i, year in enumerate(self.year_numbers) if year in years]
+
+
+def split_ids(value):
+    """Split an id field (a list or joined with |) into its ids, including any unknown (?) ones."""
+    if isinstance(value, list):
+        return value
+    # A few older rows joined ids with commas
+    return value.replace(',', '|').split('|') if value else []
+
+
+def get_cache_path(filepath, kind=None):
+    filepath = pathlib.Path(filepath)
+    if kind:
+        return filepath.with_name(f'.{filepath.name}.{kind}.pickle')
+    return filepath.with_name(f'.{filepath.name}.pickle')
+
+
+def get_file_hash(filepath):
+    with open(filepath, 'rb') as f:
+        return hashlib.file_digest(f, 'blake2b').hexdigest()
+
+
+def load_csv_cache(filepath, kind=None):
+    """Return the value cached for filepath if the csv has not changed since, otherwise None."""
+    cache_path = get_cache_path(filepath, kind)
+    try:
+        stat = os.stat(filepath)
+        with open(cache_path, 'rb') as f:
+            header = pickle.load(f)
+            if header['version'] != CACHE_VERSION or header['size'] != stat.st_size:
+                return
+            if header['mtime'] != stat.st_mtime_ns:
+                if header['hash'] != get_file_hash(filepath):
+                    return
+                header['mtime'] = stat.st_mtime_ns
+                value = pickle.load(f)
+                save_csv_cache(filepath, value, kind, header)
+                return value
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError):
+        return
+
+
+def save_csv_cache(filepath, value, kind=None, header=None):
+    try:
+        if header is None:
+            stat = os.stat(filepath)
+            header = {'version': CACHE_VERSION, 'mtime': stat.st_mtime_ns, 'size': stat.st_size,
+                      'hash': get_file_hash(filepath)}
+        with atomic_write(get_cache_path(filepath, kind), 'wb') as f:
+            pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        # The cache is only an optimization
+        pass
+
+
+def read_csv(filepath=DATA_PATH, use_cache=True, years=None):
+    if years is not None:
+        years = set(years)
+
+    if os.path.isdir(filepath):
+        return read_partitions(filepath, use_cache, years)
+
+    if use_cache:
+        table = load_csv_cache(filepath)
+        if table is not None:
+            if years is not None:
+                return OscarsTable(table.select(years=years))
+            return table
+
+    table = OscarsTable()
+    with open(filepath) as f:
+        reader = csv.reader(f, **CSV_FORMAT)
+        fields = next(reader)
+        table.extend_records(fields, filter_records(reader, fields, years))
+
+    # Only a complete table is worth caching
+    if use_cache and years is None:
+        save_csv_cache(filepath, table)
+    return table
+
+
+def filter_records(records, fields, years):
+    """Skip the csv records whose starting year is not in years (if specified) without building any dicts."""
+    if years is None:
+        return records
+    year_i = fields.index('Year')
+    return (record for record in records if parse_year(record[year_i]) in years)
+
+
+def iter_csv(filepath=DATA_PATH, years=None):
+    """Yield the rows of the csv (or partitions) one at a time as dicts, without holding the whole table in memory."""
+    if years is not None:
+        years = set(years)
+    if not os.path.isdir(filepath):
+        yield from iter_records(filepath, years)
+        return
+    for key, partition in sorted(read_manifest(filepath)['partitions'].items()):
+        if years is None or parse_year(partition['year']) in years:
+            yield from iter_records(get_partition_path(filepath, key), years)
+
+
+def iter_records(filepath, years):
+    with open(filepath) as f:
+        reader = csv.reader(f, **CSV_FORMAT)
+        fields = next(reader)
+        for record in filter_records(reader, fields, years):
+            row = dict.fromkeys(FIELDNAMES, '')
+            row.update(zip(fields, record))
+            yield row
 
 
 def format_for_csv(entry):
-    new_entry = {}
-    for k, v in entry.items():
+    unknown_fields = entry.keys() - FIELDNAMES
+    if unknown_fields:
+        raise ValueError(f'Unknown fields: {", ".join(sorted(unknown_fields))}')
+
+    values = []
+    for k in FIELDNAMES:
+        v = entry.get(k, '')
         if isinstance(v, list):
             if k in ['Film', 'FilmId', 'Nominees', 'NomineeIds', 'Detail', 'Note']:
-                new_entry[k] = '|'.join(v)
+                v = '|'.join(v)
             else:
                 click.secho(f'Unknown list value: {k}: {v}', fg='red')
-        elif isinstance(v, str):
-            new_entry[k] = v
+                v = ''
+        elif not isinstance(v, str):
+            v = str(v)
+        values.append(v)
+
+    while values and not values[-1]:
+        values.pop()
+    return values
+
+
+@contextlib.contextmanager
+def atomic_path(filepath):
+    """Yield a temporary path next to filepath which replaces filepath once the block finishes without error."""
+    filepath = pathlib.Path(filepath)
+    fd, temp_path = tempfile.mkstemp(dir=filepath.parent, prefix=f'.{filepath.name}.', suffix='.tmp')
+    os.close(fd)
+    try:
+        yield temp_path
+        if filepath.exists():
+            shutil.copymode(filepath, temp_path)
         else:
-            new_entry[k] = str(v)
+            os.chmod(temp_path, 0o644)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+@contextlib.contextmanager
+def atomic_write(filepath, mode='w'):
+    """Open a temporary file next to filepath which replaces filepath once the block finishes without error."""
+    with atomic_path(filepath) as temp_path:
+        with open(temp_path, mode) as f:
+            yield f
+
+
+def write_csv(awards, filepath=DATA_PATH, years=None):
+    if os.path.isdir(filepath):
+        write_partitions(awards, filepath, years)
+        return
+
+    records = (format_for_csv(row) for row in awards)
 
-    return new_entry
+    with atomic_write(filepath) as f:
+        writer = csv.writer(f, lineterminator='\n', **CSV_FORMAT)
+        writer.writerow(FIELDNAMES)
+        if years is None:
+            writer.writerows(records)
+            return
 
+        years = set(years)
+        year_i = FIELDNAMES.index('Year')
+        with open(filepath) as original:
+            reader = csv.reader(original, **CSV_FORMAT)
+            if next(reader) != FIELDNAMES:
+                raise ValueError(f'Unexpected fields in {filepath}')
+            kept_records = (record for record in reader if parse_year(record[year_i]) not in years)
+            # On ties the new records come first
+            writer.writerows(heapq.merge(records, kept_records, key=lambda record: parse_year(record[year_i])))
 
-def write_csv(awards, filepath=DATA_PATH):
-    with open(filepath, 'w') as f:
-        writer = csv.DictWriter(f, FIELDNAMES, delimiter='\t', doublequote=False, escapechar='\\')
-        writer.writeheader()
-        for row in awards:
-            writer.writerow(format_for_csv(row))
 
-    # Remove whitespace from the ends of lines
-    with open(filepath, 'r') as f:
-        s = f.read()
+def get_partition_path(folder, key):
+    return pathlib.Path(folder) / f'{key}.tsv'
 
-    while '\t\n' in s:
-        s = s.replace('\t\n', '\n')
 
-    with open(filepath, 'w') as f:
-        f.write(s)
+def read_manifest(folder):
+    try:
+        with open(pathlib.Path(folder) / MANIFEST_NAME) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {'partitions': {}}
+
+
+def get_cache_source(filepath):
+    """Return the file that caches of filepath are keyed on: the manifest for the partitioned layout."""
+    if os.path.isdir(filepath):
+        return pathlib.Path(filepath) / MANIFEST_NAME
+    return filepath
+
+
+def read_partitions(folder, use_cache=True, years=None):
+    """Read the partitioned layout into an OscarsTable."""
+    manifest_path = get_cache_source(folder)
+    if use_cache and years is None:
+        table = load_csv_cache(manifest_path)
+        if table is not None:
+            return table
+
+    table = OscarsTable()
+    for key, partition in sorted(read_manifest(folder)['partitions'].items()):
+        if years is not None and parse_year(partition['year']) not in years:
+            continue
+        with open(get_partition_path(folder, key)) as f:
+            reader = csv.reader(f, **CSV_FORMAT)
+            table.extend_records(next(reader), reader)
+
+    if use_cache and years is None:
+        save_csv_cache(manifest_path, table)
+    return table
+
+
+def write_partitions(awards, folder, years=None):
+    """Write the rows into one tsv per ceremony in folder, along with a manifest."""
+    folder = pathlib.Path(folder)
+    folder.mkdir(exist_ok=True)
+    manifest = read_manifest(folder)
+    partitions = manifest['partitions']
+
+    new_records = collections.defaultdict(list)
+    for row in awards:
+        record = format_for_csv(row)
+        new_records[f'{int(record[0]):03d}'].append(record)
+
+    if years is None:
+        touched = set(partitions) | set(new_records)
+    else:
+        years = set(years)
+        touched = set(new_records)
+        touched.update(key for key, partition in partitions.items() if parse_year(partition['year']) in years)
+
+    for key in sorted(touched):
+        path = get_partition_path(folder, key)
+        records = new_records.get(key, [])
+        if years is not None and key in partitions and parse_year(partitions[key]['year']) not in years:
+            with open(path) as f:
+                reader = csv.reader(f, **CSV_FORMAT)
+                next(reader)
+                records += reader
+
+        if not records:
+            path.unlink(missing_ok=True)
+            del partitions[key]
+            continue
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n', **CSV_FORMAT)
+        writer.writerow(FIELDNAMES)
+        writer.writerows(records)
+        contents = buffer.getvalue()
+        digest = hashlib.blake2b(contents.encode(), digest_size=16).hexdigest()
+
+        if partitions.get(key, {}).get('hash') != digest or not path.exists():
+            with atomic_write(path) as f:
+                f.write(contents)
+        partitions[key] = {'year': records[0][1], 'rows': len(records), 'hash': digest}
+
+    manifest['partitions'] = dict(sorted(partitions.items()))
+    with atomic_write(folder / MANIFEST_NAME) as f:
+        json.dump(manifest, f, indent=2)
+        f.write('\n')
+
+
+# The names and titles are normalized thousands of times per merge, mostly repeats, so the results are memoized
+NON_ALNUM_PATTERN = re.compile(r'[^a-z0-9]')
+SPACES_PATTERN = re.compile(' {2,}')
+
+
+@functools.cache
+def get_nabble(s):
+    """Return the lowercase letters and digits of s (transliterated to ASCII), for comparing names and titles."""
+    if s is None:
+        return None
+    import unidecode
+    s = unidecode.unidecode(s).lower()
+    if s.isascii():
+        return NON_ALNUM_PATTERN.sub('', s)
+    return ''.join(c for c in s if c.isalpha() or c.isdigit())
+
+
+def clean_string(text):
+    """Replace newlines with spaces and collapse runs of spaces."""
+    text = text.replace('\n', ' ')
+    if '  ' in text:
+        text = SPACES_PATTERN.sub(' ', text)
+    return text
+
+
+@functools.cache
+def get_department_pattern():
+    return re.compile('|'.join(re.escape(suffix) for suffix in load_aux_data('departments')))
+
+
+@functools.cache
+def remove_departments(name):
+    """Remove the department suffixes (like 'Studio Sound Department') from the name, in the order they are listed."""
+    if not get_department_pattern().search(name):
+        return name
+    for suffix in load_aux_data('departments'):
+        if suffix in name:
+            name = name.replace(suffix, '').strip()
+    return name
 
 
 def remove_enclosing(text, chars=['{}', '[]', '""']):
@@ -74,9 +558,19 @@ def remove_enclosing(text, chars=['{}', '[]', '""']):
     return text
 
 
+def load_yaml(filepath):
+    import yaml
+    with open(filepath) as f:
+        return yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
 def read_lookup_dict(filepath, lower_lookup=False):
+    return make_lookup_dict(load_yaml(filepath), lower_lookup)
+
+
+def make_lookup_dict(data, lower_lookup=False):
     d = {}
-    for k, values in yaml.safe_load(open(filepath)).items():
+    for k, values in data.items():
         if isinstance(values, str):
             values = [values]
         for v in values:
@@ -86,6 +580,258 @@ def read_lookup_dict(filepath, lower_lookup=False):
     return d
 
 
+def load_aux_data(name, lookup=False, lower_lookup=False):
+    """Return the contents of aux_data/{name}.yaml, or the lookup dict made from it."""
+    key = name, lookup, lower_lookup
+    if key in AUX_DATA:
+        return AUX_DATA[key]
+
+    filepath = AUX_DATA_PATH / f'{name}.yaml'
+    stat = os.stat(filepath)
+    kind = ('lower_lookup' if lower_lookup else 'lookup') if lookup else 'yaml'
+    cache_path = AUX_DATA_PATH / '.cache' / f'{name}.{kind}.pickle'
+    header = {'version': CACHE_VERSION, 'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+    try:
+        with open(cache_path, 'rb') as f:
+            if pickle.load(f) == header:
+                AUX_DATA[key] = pickle.load(f)
+                return AUX_DATA[key]
+    except (OSError, pickle.UnpicklingError, EOFError):
+        pass
+
+    value = load_yaml(filepath)
+    if lookup:
+        value = make_lookup_dict(value, lower_lookup)
+    try:
+        cache_path.parent.mkdir(exist_ok=True)
+        with atomic_write(cache_path, 'wb') as f:
+            pickle.dump(header, f, pickle.HIGHEST_PROTOCOL)
+            pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        pass
+    AUX_DATA[key] = value
+    return value
+
+
+class LazyAuxData:
+    """Stands in for the value of load_aux_data, which is only loaded when first used."""
+
+    def __init__(self, name, lookup=False, lower_lookup=False):
+        self.args = name, lookup, lower_lookup
+
+    @property
+    def data(self):
+        return load_aux_data(*self.args)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getattr__(self, name):
+        if name == 'args':
+            raise AttributeError(name)
+        return getattr(self.data, name)
+
+
+def connect_imdb_store(filepath=IMDB_STORE_PATH):
+    """Return a connection to the IMDb store, or None if there is no store of the current version."""
+    import sqlite3
+
+    if not os.path.exists(filepath):
+        return None
+    connection = sqlite3.connect(filepath)
+    version, = connection.execute('PRAGMA user_version').fetchone()
+    if version != IMDB_STORE_VERSION:
+        connection.close()
+        return None
+    return connection
+
+
+def write_imdb_store(imdb_data, sources, filepath=IMDB_STORE_PATH, years=None):
+    """Write the parsed IMDb data ({year: data}) to a SQLite file."""
+    rows = [(year, *sources[year], json.dumps(data, ensure_ascii=False, sort_keys=True))
+            for year, data in sorted(imdb_data.items())]
+
+    connection = connect_imdb_store(filepath) if years is not None else None
+    if connection:
+        with connection:
+            years = list(years)
+            placeholders = ', '.join(['?'] * len(years))
+            connection.execute(f'DELETE FROM Years WHERE Year IN ({placeholders})', years)
+            connection.executemany('INSERT INTO Years VALUES (?, ?, ?, ?)', rows)
+        connection.close()
+        return
+
+    import sqlite3
+
+    with atomic_path(filepath) as path:
+        connection = sqlite3.connect(path)
+        with connection:
+            connection.execute(f'PRAGMA user_version = {IMDB_STORE_VERSION}')
+            connection.execute('CREATE TABLE Years (Year INTEGER PRIMARY KEY, Source TEXT NOT NULL, '
+                               'Parser INTEGER NOT NULL, Data TEXT NOT NULL)')
+            connection.executemany('INSERT INTO Years VALUES (?, ?, ?, ?)', rows)
+        connection.close()
+
+
+def read_imdb_sources(filepath=IMDB_STORE_PATH):
+    """Return {year: (hash, parser version)} of the pages the years in the IMDb store were parsed from."""
+    connection = connect_imdb_store(filepath)
+    if connection is None:
+        return {}
+    try:
+        return {year: (source, parser) for year, source, parser in
+                connection.execute('SELECT Year, Source, Parser FROM Years')}
+    finally:
+        connection.close()
+
+
+def read_imdb_store(years=None, filepath=IMDB_STORE_PATH):
+    """Return {year: data} for the years (or all of them) in the IMDb store, or None if there is no usable store."""
+    connection = connect_imdb_store(filepath)
+    if connection is None:
+        if os.path.exists(filepath):
+            click.secho(f'{filepath} is from another version, run ./scrape_imdb_html.py again', fg='yellow')
+        return None
+    try:
+        if years is None:
+            rows = connection.execute('SELECT Year, Data FROM Years')
+        else:
+            years = list(years)
+            placeholders = ', '.join(['?'] * len(years))
+            rows = connection.execute(f'SELECT Year, Data FROM Years WHERE Year IN ({placeholders})', years)
+        return {year: json.loads(data) for year, data in rows}
+    finally:
+        connection.close()
+
+
+def load_imdb_data(years):
+    """Return {year: data} for the years, from the IMDb store or (without one) the yaml files in imdb_data."""
+    imdb_data = read_imdb_store(years)
+    if imdb_data is None:
+        imdb_data = {}
+        for year in years:
+            filepath = IMDB_DATA_PATH / f'{year}.yaml'
+            if filepath.exists():
+                imdb_data[year] = load_yaml(filepath)
+    return imdb_data
+
+
+def parse_timestamp(s):
+    """Parse an ISO date/time, in local time unless it has an offset."""
+    return datetime.datetime.fromisoformat(s).astimezone()
+
+
+def get_content_digest(f):
+    return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+
+
+class HtmlArchive:
+    """Gzipped copies of every version of the html pages in a folder."""
+
+    def __init__(self, folder):
+        self.path = pathlib.Path(folder) / ARCHIVE_NAME
+        self.lock = threading.Lock()
+        try:
+            with open(self.path / 'history.json') as f:
+                self.history = json.load(f)
+        except (OSError, ValueError):
+            self.history = {}
+
+    def __contains__(self, name):
+        return bool(self.history.get(name))
+
+    def get_object_path(self, digest):
+        return self.path / 'objects' / digest[:2] / f'{digest}.html.gz'
+
+    def add(self, name, f):
+        """Archive the contents of the binary file f as the latest version of the page. Returns whether it changed."""
+        digest = get_content_digest(f)
+        size = f.seek(0, io.SEEK_END)
+        object_path = self.get_object_path(digest)
+        if not object_path.exists():
+            f.seek(0)
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            with atomic_write(object_path, 'wb') as out, gzip.GzipFile(fileobj=out, mode='wb', mtime=0) as gz:
+                shutil.copyfileobj(f, gz, 1 << 20)
+
+        with self.lock:
+            versions = self.history.setdefault(name, [])
+            if versions and versions[-1]['hash'] == digest:
+                return False
+            archived = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+            versions.append({'hash': digest, 'size': size, 'archived': archived})
+        return True
+
+    def add_file(self, filepath):
+        filepath = pathlib.Path(filepath)
+        with open(filepath, 'rb') as f:
+            return self.add(filepath.name, f)
+
+    def find(self, name, as_of=None):
+        """Return the latest version of the page (archived before as_of if given), or None."""
+        for version in reversed(self.history.get(name, [])):
+            if as_of is None or datetime.datetime.fromisoformat(version['archived']) < as_of:
+                return version
+
+    def open(self, name, as_of=None, mode='rt'):
+        """Open the latest version of the page (archived before as_of if given) for reading."""
+        version = self.find(name, as_of)
+        if version is None:
+            raise FileNotFoundError(f'{name} is not in {self.path}' + (f' before {as_of}' if as_of else ''))
+        return gzip.open(self.get_object_path(version['hash']), mode)
+
+    def save(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with atomic_write(self.path / 'history.json') as f:
+            json.dump(self.history, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+def open_html(filepath, as_of=None):
+    """Open an html page for reading as text."""
+    filepath = pathlib.Path(filepath)
+    if as_of is None and filepath.exists():
+        return open(filepath)
+    return HtmlArchive(filepath.parent).open(filepath.name, as_of)
+
+
+def get_html_digest(filepath, as_of=None, archive=None):
+    """Return the digest of the page that open_html would read (the name of its version in the archive), or None."""
+    filepath = pathlib.Path(filepath)
+    if as_of is None and filepath.exists():
+        with open(filepath, 'rb') as f:
+            return get_content_digest(f)
+    version = (archive or HtmlArchive(filepath.parent)).find(filepath.name, as_of)
+    return version and version['hash']
+
+
+def archive_html(filepaths):
+    """Add the html files to the archives of their folders."""
+    archives = {}
+    changed = []
+    for filepath in map(pathlib.Path, filepaths):
+        if not filepath.exists():
+            continue
+        archive = archives.get(filepath.parent)
+        if archive is None:
+            archive = archives[filepath.parent] = HtmlArchive(filepath.parent)
+        if archive.add_file(filepath):
+            changed.append(filepath)
+    for archive in archives.values():
+        archive.save()
+    return changed
+
+
 def find_by_class(soup, name, class_name):
     return soup.find(name, {'class': class_name})
 
@@ -94,15 +840,26 @@ def find_all_by_class(soup, name, class_name):
     return soup.find_all(name, {'class': class_name})
 
 
-class BeautifulParser(bs4.BeautifulSoup):
-    def __init__(self, obj):
-        bs4.BeautifulSoup.__init__(self, obj, 'lxml')
+def __getattr__(name):
+    # bs4 and lxml are slow to import and only needed for parsing html,
+    # so BeautifulParser is only defined once a script imports it
+    if name != 'BeautifulParser':
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+    import bs4
+
+    class BeautifulParser(bs4.BeautifulSoup):
+        def __init__(self, obj):
+            bs4.BeautifulSoup.__init__(self, obj, 'lxml')
+
+        def find_by_class(self, name, class_name):
+            return find_by_class(self, name, class_name)
 
-    def find_by_class(self, name, class_name):
-        return find_by_class(self, name, class_name)
+        def find_all_by_class(self, name, class_name):
+            return find_all_by_class(self, name, class_name)
 
-    def find_all_by_class(self, name, class_name):
-        return find_all_by_class(self, name, class_name)
+    globals()['BeautifulParser'] = BeautifulParser
+    return BeautifulParser
 
 
 def parse_years(years_s_list):